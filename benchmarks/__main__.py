@@ -0,0 +1,122 @@
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import typing as t
+
+from benchmarks.cases import CASES, Case
+
+
+def get_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(case: Case, size: int, repeat: int) -> t.Dict[str, t.Any]:
+    if case.measure is not None:
+        value, unit = case.measure(size)
+
+        return {"name": case.name, "size": size, "value": value, "unit": unit}
+
+    timings = []
+
+    for _ in range(repeat):
+        params = case.setup(size)
+        # collections are triggered by garbage from previous runs otherwise
+        gc.collect()
+        start = time.perf_counter()
+        case.run(params)
+        timings.append(time.perf_counter() - start)
+        del params
+
+    return {
+        "name": case.name,
+        "size": size,
+        "value": min(timings),
+        "unit": "s",
+        "mean": sum(timings) / len(timings),
+        "per_item_us": min(timings) / size * 1e6,
+    }
+
+
+def compare(results: t.List[t.Dict], baseline: t.List[t.Dict]):
+    previous = {(result["name"], result["size"]): result for result in baseline}
+
+    print(f"{'case':<24}{'size':>10}{'before':>14}{'after':>14}{'ratio':>8}")
+
+    for result in results:
+        before = previous.get((result["name"], result["size"]))
+
+        if before is None:
+            continue
+
+        ratio = result["value"] / before["value"] if before["value"] else 0
+
+        print(
+            f"{result['name']:<24}{result['size']:>10}"
+            f"{before['value']:>14.6g}{result['value']:>14.6g}{ratio:>8.2f}",
+        )
+
+
+def main(args: t.Optional[t.List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Measures hot paths of corm",
+    )
+    parser.add_argument(
+        "cases",
+        nargs="*",
+        help=f"cases to run, all by default: {', '.join(CASES)}",
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="file to write results as json")
+    parser.add_argument("--compare", help="results of previous run to compare with")
+    options = parser.parse_args(args)
+
+    unknown = set(options.cases) - set(CASES)
+
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    cases = [CASES[name] for name in options.cases or CASES]
+    results = []
+
+    for case in cases:
+        for size in options.sizes:
+            result = run_case(case, size, options.repeat)
+            results.append(result)
+
+            print(
+                f"{case.name:<24}{size:>10}{result['value']:>14.6g} {result['unit']}",
+                file=sys.stderr,
+            )
+
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if options.compare:
+        with open(options.compare) as file:
+            compare(results, json.load(file)["results"])
+
+
+if __name__ == "__main__":
+    main()
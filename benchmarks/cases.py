@@ -0,0 +1,451 @@
+import gc
+import tracemalloc
+import typing as t
+
+from corm import (
+    CompositeKey,
+    Entity,
+    Field,
+    IndexType,
+    KeyNested,
+    Nested,
+    Relationship,
+    RelationType,
+    Storage,
+)
+
+CASES = {}
+
+
+class Case(t.NamedTuple):
+    name: str
+    # prepares input for run, called before every repetition and not timed
+    setup: t.Callable[[int], t.Any]
+    run: t.Callable[[t.Any], t.Any]
+    # measures something else than time, e.g. memory, returns value and unit
+    measure: t.Optional[t.Callable[[int], t.Tuple[float, str]]] = None
+
+
+def case(name: str, setup: t.Callable[[int], t.Any]):
+    def decorator(run):
+        CASES[name] = Case(name, setup, run)
+
+        return run
+
+    return decorator
+
+
+def metric(name: str):
+    def decorator(measure):
+        CASES[name] = Case(name, None, None, measure)
+
+        return measure
+
+    return decorator
+
+
+class Address(Entity):
+    street: str
+    number: int
+    user: "User" = Relationship(entity_type="User", relation_type=RelationType.PARENT)
+
+
+class User(Entity):
+    id: int = Field(pk=True)
+    name: str
+    email: str
+    score: int = Field(index=IndexType.SORTED)
+    manager: "User" = KeyNested(
+        related_entity_field=id,
+        origin="manager_id",
+        back_relation=True,
+        required=False,
+    )
+    team: t.List["User"] = Relationship(entity_type="User", many=True)
+    addresses: t.List[Address] = Nested(
+        entity_type=Address,
+        many=True,
+        back_relation=RelationType.PARENT,
+    )
+
+
+class Flat(Entity):
+    id: int = Field(pk=True)
+    name: str
+    email: str
+    age: int
+    active: bool
+
+
+class SlotsFlat(Entity):
+    class Config:
+        slots = True
+
+    id: int = Field(pk=True)
+    name: str
+    email: str
+    age: int
+    active: bool
+
+
+class ColumnarFlat(Entity):
+    class Config:
+        columnar = True
+        slots = True
+
+    id: int = Field(pk=True)
+    name: str
+    email: str
+    age: int
+    active: bool
+
+
+class Metric(Entity):
+    class Config:
+        slots = True
+
+    time: float
+    value: float
+    count: int
+    ok: bool
+
+
+class ColumnarMetric(Entity):
+    class Config:
+        columnar = True
+        slots = True
+
+    time: float
+    value: float
+    count: int
+    ok: bool
+
+
+class Node(Entity):
+    value: int
+    parent: "Node" = Relationship(entity_type="Node", relation_type=RelationType.PARENT)
+    children: t.List["Node"] = Nested(
+        entity_type="Node",
+        many=True,
+        back_relation=RelationType.PARENT,
+    )
+
+
+DEPTH = 20
+
+
+def make_flat(size: int) -> t.List[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"user {i}",
+            "email": f"user{i}@mail.com",
+            "age": i % 90,
+            "active": i % 2 == 0,
+        }
+        for i in range(size)
+    ]
+
+
+def make_users(size: int) -> t.List[dict]:
+    # every user has manager loaded before it, addresses are nested
+    return [
+        {
+            "id": i,
+            "name": f"user {i}",
+            "email": f"user{i}@mail.com",
+            "score": i % 100,
+            "manager_id": i // 10 if i else None,
+            "addresses": [
+                {"street": "first", "number": i},
+                {"street": "second", "number": i},
+            ],
+        }
+        for i in range(size)
+    ]
+
+
+def make_tree(depth: int) -> dict:
+    data = {"value": 0, "children": []}
+
+    for value in range(1, depth):
+        data = {"value": value, "children": [data]}
+
+    return data
+
+
+def load_users(size: int) -> Storage:
+    storage = Storage()
+    storage.load_many(User, make_users(size))
+
+    return storage
+
+
+@case("entity_init", setup=make_flat)
+def entity_init(items):
+    storage = Storage()
+
+    for data in items:
+        Flat(data, storage)
+
+
+@case("load_many", setup=make_flat)
+def load_many(items):
+    Flat.load_many(items, Storage())
+
+
+@case(
+    "nested_deep", setup=lambda size: [make_tree(DEPTH) for _ in range(size // DEPTH)]
+)
+def nested_deep(items):
+    storage = Storage()
+
+    for data in items:
+        Node(data, storage)
+
+
+@case("nested_wide", setup=make_users)
+def nested_wide(items):
+    # one list of addresses per user with back relation to it
+    storage = Storage()
+
+    for data in items:
+        User(data, storage)
+
+
+@case("key_nested_forward", setup=lambda size: list(reversed(make_users(size))))
+def key_nested_forward(items):
+    # managers are loaded after their teams, relations wait in pending table
+    User.load_many(items, Storage())
+
+
+@case("key_nested_get", setup=load_users)
+def key_nested_get(storage):
+    for user in storage.get_entities(User):
+        user.manager
+
+
+class Employee(Entity):
+    id: int = Field(pk=True)
+    manager: "Employee" = KeyNested(
+        related_entity_field=id,
+        origin="manager_id",
+        required=False,
+        reverse_index=True,
+    )
+
+
+class RelatedEmployee(Entity):
+    id: int = Field(pk=True)
+    manager: "RelatedEmployee" = KeyNested(
+        related_entity_field=id,
+        origin="manager_id",
+        required=False,
+        back_relation=True,
+    )
+
+
+@case(
+    "key_nested_back_relation",
+    setup=lambda size: list(reversed(make_users(size))),
+)
+def key_nested_back_relation(items):
+    RelatedEmployee.load_many(items, Storage())
+
+
+@case(
+    "key_nested_reverse_index",
+    setup=lambda size: list(reversed(make_users(size))),
+)
+def key_nested_reverse_index(items):
+    Employee.load_many(items, Storage())
+
+
+@case(
+    "get_referencing",
+    setup=lambda size: Employee.load_many(make_users(size), Storage()),
+)
+def get_referencing(employees):
+    storage = employees[0].storage
+
+    for employee in employees:
+        storage.get_referencing(Employee.manager, employee)
+
+
+@case("relationship_many", setup=load_users)
+def relationship_many(storage):
+    for user in storage.get_entities(User):
+        for _ in user.team:
+            pass
+
+
+@case("relationship_one", setup=load_users)
+def relationship_one(storage):
+    for address in storage.get_entities(Address):
+        address.user
+
+
+@case(
+    "relationship_deep",
+    setup=lambda size: Node.load_many(
+        [make_tree(DEPTH) for _ in range(size // DEPTH)],
+        Storage(),
+    ),
+)
+def relationship_deep(roots):
+    # walks from every leaf up to root
+    leaves = []
+
+    for node in roots:
+        while node.children:
+            node = node.children[0]
+
+        leaves.append(node)
+
+    for node in leaves:
+        while node is not None:
+            node = node.parent
+
+
+@case("make_relation", setup=lambda size: (Storage(), make_flat(size)))
+def make_relation(params):
+    storage, items = params
+    users = Flat.load_many(items, storage)
+    root = users[0]
+
+    for user in users:
+        storage.make_relation(root, user, RelationType.CHILD)
+        storage.make_relation(user, root, RelationType.PARENT)
+
+
+@case("get", setup=load_users)
+def get(storage):
+    for i in range(len(storage._get_types()[User])):
+        storage.get(User.id, i)
+
+
+class Account(Entity):
+    tenant_id: int
+    id: int
+    key: t.Tuple[int, int] = CompositeKey("tenant_id", "id")
+
+
+def load_accounts(size: int) -> Storage:
+    storage = Storage()
+    Account.load_many(
+        [{"tenant_id": i % 10, "id": i // 10} for i in range(size)],
+        storage,
+    )
+
+    return storage
+
+
+@case("get_composite", setup=load_accounts)
+def get_composite(storage):
+    for i in range(len(storage._get_types()[Account])):
+        storage.get(Account.key, (i % 10, i // 10))
+
+
+@case("dict", setup=load_users)
+def dump(storage):
+    for user in storage.get_entities(User):
+        user.dict(snapshot=True)
+
+
+@case("select", setup=load_users)
+def select(storage):
+    for score in range(0, 100, 10):
+        storage.select(User).filter(score__between=(score, score + 5)).all()
+
+
+@case("snapshot_dump", setup=load_users)
+def snapshot_dump(storage):
+    storage.dumps()
+
+
+@case("snapshot_load", setup=lambda size: load_users(size).dumps())
+def snapshot_load(data):
+    Storage.loads(data)
+
+
+@case(
+    "column_sum",
+    setup=lambda size: ColumnarFlat.load_many(make_flat(size), Storage())[0].storage,
+)
+def column_sum(storage):
+    storage.column(ColumnarFlat.age).sum()
+
+
+@case("getattr_sum", setup=lambda size: Flat.load_many(make_flat(size), Storage()))
+def getattr_sum(entities):
+    sum(entity.age for entity in entities)
+
+
+def make_batch(size: int):
+    batch = load_users(size).batch(User)
+    # values are extracted on first use and cached after
+    batch.group_by("score")
+
+    return batch
+
+
+@case("batch_filter_sum", setup=make_batch)
+def batch_filter_sum(batch):
+    batch.filter(score__gt=50).sum("score")
+
+
+@case("batch_group_by", setup=make_batch)
+def batch_group_by(batch):
+    batch.group_by("score").mean("score")
+
+
+def make_metrics(size: int) -> t.List[dict]:
+    return [
+        {"time": i * 0.1, "value": i * 1.5, "count": i + 1000, "ok": i % 2 == 0}
+        for i in range(size)
+    ]
+
+
+def measure_memory(
+    entity_type: t.Type[Entity],
+    make: t.Callable[[int], t.List[dict]],
+    size: int,
+) -> float:
+    # data of entities is kept by them, so it's measured as well
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        storage = Storage()
+        entity_type.load_many(make(size), storage)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return (after - before) / size
+
+
+@metric("memory_entity")
+def memory_entity(size: int) -> t.Tuple[float, str]:
+    return measure_memory(Flat, make_flat, size), "bytes/entity"
+
+
+@metric("memory_entity_slots")
+def memory_entity_slots(size: int) -> t.Tuple[float, str]:
+    return measure_memory(SlotsFlat, make_flat, size), "bytes/entity"
+
+
+@metric("memory_entity_columnar")
+def memory_entity_columnar(size: int) -> t.Tuple[float, str]:
+    return measure_memory(ColumnarFlat, make_flat, size), "bytes/entity"
+
+
+@metric("memory_metric")
+def memory_metric(size: int) -> t.Tuple[float, str]:
+    return measure_memory(Metric, make_metrics, size), "bytes/entity"
+
+
+@metric("memory_metric_columnar")
+def memory_metric_columnar(size: int) -> t.Tuple[float, str]:
+    return measure_memory(ColumnarMetric, make_metrics, size), "bytes/entity"
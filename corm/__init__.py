@@ -5,9 +5,12 @@ from corm.fields import (
     Relationship,
     KeyNested,
     KeyManager,
+    CompositeKey,
 )
 from corm.storage import Storage, Query
-from corm.constants import RelationType, AccessMode
+from corm.mapped import MappedStorage
+from corm.threadsafe import ConcurrentStorage
+from corm.constants import RelationType, AccessMode, IndexType
 from corm.hooks import Hook
 
 __all__ = (
@@ -17,9 +20,13 @@ __all__ = (
     "Relationship",
     "KeyNested",
     "KeyManager",
+    "CompositeKey",
     "Storage",
+    "MappedStorage",
+    "ConcurrentStorage",
     "Query",
     "RelationType",
     "AccessMode",
+    "IndexType",
     "Hook",
 )
@@ -0,0 +1,359 @@
+import operator
+import typing as t
+
+import numpy as np
+
+if t.TYPE_CHECKING:
+    from corm.entity import Entity
+    from corm.fields import Field
+    from corm.storage import Storage
+
+
+def _in(values: np.ndarray, options: t.Iterable) -> np.ndarray:
+    return np.isin(values, list(options))
+
+
+def _between(values: np.ndarray, bounds: t.Tuple[t.Any, t.Any]) -> np.ndarray:
+    return (values >= bounds[0]) & (values <= bounds[1])
+
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "in": _in,
+    "between": _between,
+}
+ORDERING_OPERATORS = {"lt", "le", "gt", "ge", "between"}
+# whether entity without value matches condition, same as in `Query.filter`
+NONE_MATCHES = {
+    "eq": lambda value: value is None,
+    "ne": lambda value: value is not None,
+    "in": lambda options: None in options,
+}
+
+
+def _make_values(items: t.List[t.Any]) -> np.ndarray:
+    # None can't be kept in typed array, values of entities without value are
+    # masked out
+    values = np.array(items)
+
+    if values.dtype != object:
+        return values
+
+    present = np.array([item is not None for item in items], dtype=bool)
+
+    if present.all():
+        return values
+
+    filler = next((item for item in items if item is not None), 0)
+
+    return np.ma.masked_array(
+        np.array([filler if item is None else item for item in items]),
+        mask=~present,
+    )
+
+
+def _compare(values: np.ndarray, operator_name: str, value: t.Any) -> np.ndarray:
+    if not np.ma.isMaskedArray(values):
+        return OPERATORS[operator_name](values, value)
+
+    result = np.asarray(OPERATORS[operator_name](values.data, value), dtype=bool)
+    matches = operator_name not in ORDERING_OPERATORS and NONE_MATCHES[operator_name](
+        value
+    )
+    result[np.ma.getmaskarray(values)] = matches
+
+    return result
+
+
+def _present(values: np.ndarray) -> np.ndarray:
+    return values.compressed() if np.ma.isMaskedArray(values) else values
+
+
+def _get_stamp(storage: "Storage", entity_type: t.Type["Entity"]) -> t.Tuple:
+    # removing entities changes version, so set of entities is the same
+    # while version and number of entities are the same
+    return storage.version, sum(
+        len(entities)
+        for type_, entities in storage._get_types().items()
+        if issubclass(type_, entity_type)
+    )
+
+
+class Batch:
+    """Bulk evaluation over all entities of type with numpy
+
+    Values of field are extracted from entities once and kept by storage
+    until field is set on any entity or entities are added or removed,
+    values of columnar fields are taken from columns as is.
+    """
+
+    def __init__(
+        self,
+        storage: "Storage",
+        entity_type: t.Type["Entity"],
+        mask: t.Optional[np.ndarray] = None,
+    ):
+        self.storage = storage
+        self.entity_type = entity_type
+        self._mask = mask
+
+    def _get_field(self, field: t.Union[str, "Field"]) -> "Field":
+        if not isinstance(field, str):
+            return field
+
+        try:
+            return self.entity_type.__fields__[field]
+        except KeyError:
+            raise ValueError(
+                f"Entity {self.entity_type.__name__} has no field '{field}'",
+            ) from None
+
+    def _get_entities(self) -> t.List["Entity"]:
+        storage = self.storage
+
+        if self.entity_type.__columns__:
+            return storage.column_entities(self.entity_type)
+
+        # entities aren't cached by weak storage, they would be kept alive
+        if storage.weak:
+            return list(storage.get_entities(self.entity_type))
+
+        stamp = _get_stamp(storage, self.entity_type)
+        cached = storage._entity_cache.get(self.entity_type)
+
+        if cached is None or cached[0] != stamp:
+            cached = storage._entity_cache[self.entity_type] = (
+                stamp,
+                list(storage.get_entities(self.entity_type)),
+            )
+
+        return cached[1]
+
+    def _get_cached(self, field: "Field") -> t.Tuple[np.ndarray, t.Optional[t.Tuple]]:
+        # values of field and their groups if they were grouped already
+        storage = self.storage
+
+        if field.origin in self.entity_type.__columns__:
+            return storage.column(field), None
+
+        stamp = None if storage.weak else _get_stamp(storage, self.entity_type)
+        cache = storage._column_cache.get(field)
+        cached = cache and cache.get(self.entity_type)
+
+        if cached is not None and stamp is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+
+        values = _make_values(
+            list(map(operator.attrgetter(field.name), self._get_entities())),
+        )
+
+        if stamp is not None:
+            storage._column_cache.setdefault(field, {})[self.entity_type] = (
+                stamp,
+                values,
+                None,
+            )
+
+        return values, None
+
+    def _get_values(self, field: "Field") -> np.ndarray:
+        return self._get_cached(field)[0]
+
+    def _get_groups(self, field: "Field") -> t.Tuple[np.ndarray, np.ndarray]:
+        values, groups = self._get_cached(field)
+
+        if groups is None:
+            if np.ma.isMaskedArray(values):
+                # entities without value make group with None key
+                present = ~np.ma.getmaskarray(values)
+                keys, inverse = np.unique(values.data[present], return_inverse=True)
+                keys = np.append(keys.astype(object), None)
+                indexes = np.full(len(values), len(keys) - 1)
+                indexes[present] = inverse.reshape(-1)
+                groups = keys, indexes
+            else:
+                keys, inverse = np.unique(values, return_inverse=True)
+                groups = keys, inverse.reshape(-1)
+            cached = self.storage._column_cache.get(field, {}).get(self.entity_type)
+
+            # values are sorted once while they are the same
+            if cached is not None and cached[1] is values:
+                self.storage._column_cache[field][self.entity_type] = (
+                    cached[0],
+                    values,
+                    groups,
+                )
+
+        return groups
+
+    def column(self, field: t.Union[str, "Field"]) -> np.ndarray:
+        """Values of field of entities in batch"""
+        values = self._get_values(self._get_field(field))
+
+        if self._mask is not None:
+            values = values[self._mask]
+
+        return values
+
+    def filter(self, *args, **kwargs) -> "Batch":
+        """Filter entities of batch
+
+        Keyword arguments are the same as in `Query.filter`, positional
+        arguments are callables accepting batch and returning boolean array,
+        e.g. `lambda batch: batch.column("price") > batch.column("cost")`.
+        """
+        mask = np.ones(len(self._get_entities()), dtype=bool)
+
+        for key, value in kwargs.items():
+            name, _, operator_name = key.partition("__")
+            operator_name = operator_name or "eq"
+
+            if operator_name not in OPERATORS:
+                raise ValueError(f"Unknown operator '{operator_name}'")
+
+            mask &= _compare(
+                self._get_values(self._get_field(name)),
+                operator_name,
+                value,
+            )
+
+        # predicates get unfiltered batch, so their arrays have the same shape
+        whole = Batch(self.storage, self.entity_type)
+
+        for predicate in args:
+            if not callable(predicate):
+                raise ValueError(f"Predicate should be callable, got: {predicate}")
+
+            mask &= np.asarray(np.ma.filled(predicate(whole), False), dtype=bool)
+
+        if self._mask is not None:
+            mask &= self._mask
+
+        return Batch(self.storage, self.entity_type, mask)
+
+    def all(self) -> t.List["Entity"]:
+        entities = self._get_entities()
+
+        if self._mask is None:
+            return list(entities)
+
+        return [entities[i] for i in np.flatnonzero(self._mask)]
+
+    def count(self) -> int:
+        if self._mask is None:
+            return len(self._get_entities())
+
+        return int(np.count_nonzero(self._mask))
+
+    def sum(self, field: t.Union[str, "Field"]) -> t.Any:
+        return _present(self.column(field)).sum().item()
+
+    def min(self, field: t.Union[str, "Field"]) -> t.Any:
+        values = _present(self.column(field))
+
+        return values.min().item() if len(values) else None
+
+    def max(self, field: t.Union[str, "Field"]) -> t.Any:
+        values = _present(self.column(field))
+
+        return values.max().item() if len(values) else None
+
+    def mean(self, field: t.Union[str, "Field"]) -> t.Optional[float]:
+        values = _present(self.column(field))
+
+        return values.mean().item() if len(values) else None
+
+    def group_by(self, field: t.Union[str, "Field"]) -> "GroupBy":
+        keys, groups = self._get_groups(self._get_field(field))
+
+        if self._mask is not None:
+            groups = groups[self._mask]
+            counts = np.bincount(groups, minlength=len(keys))
+            # groups without entities in batch are dropped
+            present = counts > 0
+            groups = (np.cumsum(present) - 1)[groups]
+            keys = keys[present]
+
+        return GroupBy(self, keys, groups)
+
+
+class GroupBy:
+    """Aggregates of batch by values of field"""
+
+    def __init__(self, batch: Batch, keys: np.ndarray, groups: np.ndarray):
+        self.batch = batch
+        self.keys = keys
+        # index of key for every entity of batch
+        self._groups = groups
+
+    def _result(self, values: np.ndarray) -> t.Dict[t.Any, t.Any]:
+        return dict(zip(self.keys.tolist(), values.tolist()))
+
+    def _get_values(self, field: t.Union[str, "Field"]) -> t.Tuple[np.ndarray, ...]:
+        # values of field and groups of their entities, entities without value
+        # are skipped
+        values = self.batch.column(field)
+
+        if not np.ma.isMaskedArray(values):
+            return values, self._groups
+
+        present = ~np.ma.getmaskarray(values)
+
+        return values.data[present], self._groups[present]
+
+    def count(self) -> t.Dict[t.Any, int]:
+        return self._result(np.bincount(self._groups, minlength=len(self.keys)))
+
+    def sum(self, field: t.Union[str, "Field"]) -> t.Dict[t.Any, t.Any]:
+        values, groups = self._get_values(field)
+        sums = np.zeros(len(self.keys), dtype=np.result_type(values.dtype, np.int64))
+        np.add.at(sums, groups, values)
+
+        return self._result(sums)
+
+    def mean(self, field: t.Union[str, "Field"]) -> t.Dict[t.Any, t.Optional[float]]:
+        values, groups = self._get_values(field)
+        weights = values.astype(float)
+        sums = np.bincount(groups, weights=weights, minlength=len(self.keys))
+        counts = np.bincount(groups, minlength=len(self.keys))
+
+        return {
+            key: total / count if count else None
+            for key, total, count in zip(
+                self.keys.tolist(),
+                sums.tolist(),
+                counts.tolist(),
+            )
+        }
+
+    def _reduce(self, ufunc: np.ufunc, field: t.Union[str, "Field"]) -> t.Dict:
+        values, groups = self._get_values(field)
+        # groups without values get None
+        result = dict.fromkeys(self.keys.tolist())
+
+        if not len(values):
+            return result
+
+        # values sorted by group are reduced from start of every group
+        order = np.argsort(groups, kind="stable")
+        groups = groups[order]
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        result.update(
+            zip(
+                self.keys[groups[starts]].tolist(),
+                ufunc.reduceat(values[order], starts).tolist(),
+            ),
+        )
+
+        return result
+
+    def min(self, field: t.Union[str, "Field"]) -> t.Dict[t.Any, t.Any]:
+        return self._reduce(np.minimum, field)
+
+    def max(self, field: t.Union[str, "Field"]) -> t.Dict[t.Any, t.Any]:
+        return self._reduce(np.maximum, field)
@@ -0,0 +1,298 @@
+import typing as t
+import weakref
+
+from collections.abc import MutableMapping
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+if t.TYPE_CHECKING:
+    from corm.entity import Entity
+    from corm.fields import Field
+
+DTYPES = {
+    int: "int64",
+    float: "float64",
+    bool: "bool",
+    "int": "int64",
+    "float": "float64",
+    "bool": "bool",
+}
+# python types which are written to columns of dtype kind as is
+NATIVE_TYPES = {
+    "i": (int, bool),
+    "f": (float, int, bool),
+    "b": (bool,),
+}
+INT64_RANGE = range(-(2**63), 2**63)
+
+
+def get_columns(
+    fields: t.Dict[str, "Field"],
+    annotations: t.Dict[str, t.Any],
+) -> t.Dict[str, t.Any]:
+    """Columns of columnar entity: origin of field -> numpy dtype
+
+    Only plain fields annotated with int, float or bool are kept in columns.
+    """
+    from corm.fields import Field
+
+    if np is None:
+        raise ImportError("numpy is required for columnar entities")
+
+    return {
+        field.origin: np.dtype(DTYPES[annotations[name]])
+        for name, field in fields.items()
+        if type(field) is Field and annotations.get(name) in DTYPES
+    }
+
+
+class _Ref(weakref.ref):
+    __slots__ = ("row",)
+
+
+def _release(ref: _Ref):
+    # entity of weak storage is gone, its row is reused
+    row = ref.row
+
+    if row is not None:
+        row.table.remove(row)
+
+
+class Row(MutableMapping):
+    """Data of columnar entity
+
+    Values of column fields are kept in arrays of table at index of row,
+    other values are in ordinary dict.
+    """
+
+    __slots__ = ("table", "index", "extra")
+
+    def __init__(
+        self,
+        table: "ColumnTable",
+        index: int,
+        extra: t.Optional[t.Dict[str, t.Any]],
+    ):
+        self.table = table
+        self.index = index
+        self.extra = extra
+
+    def __getitem__(self, key: str) -> t.Any:
+        column = self.table.columns.get(key)
+
+        if column is not None:
+            return column.item(self.index)
+
+        if self.extra is None:
+            raise KeyError(key)
+
+        return self.extra[key]
+
+    def get(self, key: str, default: t.Any = None) -> t.Any:
+        column = self.table.columns.get(key)
+
+        if column is not None:
+            return column.item(self.index)
+
+        if self.extra is None:
+            return default
+
+        return self.extra.get(key, default)
+
+    def __setitem__(self, key: str, value: t.Any):
+        if key in self.table.columns:
+            self.table.set(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in self.table.columns:
+            raise ValueError(f"Column '{key}' can't be deleted")
+
+        if self.extra is None:
+            raise KeyError(key)
+
+        del self.extra[key]
+
+    def __contains__(self, key: t.Any) -> bool:
+        return key in self.table.columns or (
+            self.extra is not None and key in self.extra
+        )
+
+    def __iter__(self) -> t.Iterator[str]:
+        yield from self.table.columns
+
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return len(self.table.columns) + len(self.extra or ())
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def detach(self) -> t.Dict[str, t.Any]:
+        """Move data to ordinary dict and free row"""
+        data = dict(self)
+        self.table.remove(self)
+
+        return data
+
+
+class ColumnTable:
+    """Values of column fields of entities of one type in typed arrays"""
+
+    def __init__(
+        self,
+        columns: t.Dict[str, t.Any],
+        weak: bool = False,
+        capacity: int = 1024,
+    ):
+        self.weak = weak
+        self.size = 0
+        self.capacity = capacity
+        self.columns = {
+            name: np.empty(capacity, dtype) for name, dtype in columns.items()
+        }
+        # entity of every row in the same order as in columns, weak storage
+        # keeps references to entities which free their rows when gone
+        self._items: t.List[t.Union["Entity", _Ref]] = []
+
+    def _get_row(self, item: t.Union["Entity", _Ref]) -> Row:
+        return item.row if self.weak else item._data
+
+    def _make_item(self, entity: "Entity", row: Row) -> t.Union["Entity", _Ref]:
+        if not self.weak:
+            return entity
+
+        ref = _Ref(entity, _release)
+        ref.row = row
+
+        return ref
+
+    def _reserve(self, size: int):
+        if size <= self.capacity:
+            return
+
+        while self.capacity < size:
+            self.capacity *= 2
+
+        for name, column in self.columns.items():
+            new = np.empty(self.capacity, column.dtype)
+            new[: self.size] = column[: self.size]
+            self.columns[name] = new
+
+    def _check(self, name: str, value: t.Any):
+        if value is None:
+            raise ValueError(f"Column '{name}' can't be None")
+
+        dtype = self.columns[name].dtype
+
+        if type(value) in NATIVE_TYPES[dtype.kind]:
+            if dtype.kind != "i" or value in INT64_RANGE:
+                return
+        else:
+            # numpy scalars and other values are taken if nothing is lost
+            try:
+                np.array(value).astype(dtype, casting="safe")
+                return
+            except (TypeError, ValueError):
+                pass
+
+        raise ValueError(f"Value {value!r} can't be kept in column '{name}' ({dtype})")
+
+    def add(self, entity: "Entity", data: t.Dict[str, t.Any]) -> Row:
+        """Move values of columns from data to new row
+
+        Row becomes data of entity right away, rows are found by entities when
+        other rows are removed.
+        """
+        columns = self.columns
+        index = self.size
+
+        for name in columns:
+            if name not in data:
+                raise ValueError(f"No value for column '{name}' of {type(entity)}")
+
+            self._check(name, data[name])
+
+        self._reserve(index + 1)
+
+        for name, column in self.columns.items():
+            column[index] = data.pop(name)
+
+        row = entity._data = Row(self, index, data or None)
+        self._items.append(self._make_item(entity, row))
+        self.size += 1
+
+        return row
+
+    def set(self, row: Row, name: str, value: t.Any):
+        self._check(name, value)
+        self.columns[name][row.index] = value
+
+    def remove(self, row: Row):
+        # last row takes place of removed one, so columns don't have holes
+        index = row.index
+        last = self.size - 1
+
+        if self.weak:
+            self._items[index].row = None
+
+        if index != last:
+            for column in self.columns.values():
+                column[index] = column[last]
+
+            item = self._items[index] = self._items[last]
+            self._get_row(item).index = index
+
+        self._items.pop()
+        self.size = last
+
+    def extend(self, other: "ColumnTable"):
+        """Take all rows of other table"""
+        offset = self.size
+        self._reserve(offset + other.size)
+
+        for name, column in self.columns.items():
+            column[offset : offset + other.size] = other.columns[name][: other.size]
+
+        for item in other._items:
+            row = other._get_row(item)
+            row.table = self
+            row.index += offset
+
+            if self.weak != other.weak:
+                if other.weak:
+                    # row is taken by this table, old reference mustn't free it
+                    item.row = None
+                    item = item()
+
+                item = self._make_item(item, row)
+
+            self._items.append(item)
+
+        self.size += other.size
+        other._items = []
+        other.size = 0
+
+    def column(self, name: str) -> "np.ndarray":
+        view = self.columns[name][: self.size]
+        # values are changed through fields only, so indexes stay correct
+        view.flags.writeable = False
+
+        return view
+
+    def entities(self) -> t.List["Entity"]:
+        if self.weak:
+            return [ref() for ref in self._items]
+
+        return list(self._items)
+
+    def __len__(self) -> int:
+        return self.size
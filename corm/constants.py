@@ -21,3 +21,8 @@ class RelationType(int, enum.Enum):
     PARENT = 1
     CHILD = 2
     RELATED = 3
+
+
+class IndexType(int, enum.Enum):
+    HASH = 1
+    SORTED = 2
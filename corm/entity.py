@@ -1,13 +1,200 @@
 import typing as t
 
+from types import MemberDescriptorType
+
 from corm import registry, constants
-from corm.fields import Field, Nested
+from corm.fields import CompositeKey, Field, Nested
 
 if t.TYPE_CHECKING:
     from corm.storage import Storage
     from corm.hooks import Hook
 
 
+def _compile_loader(
+    fields: t.Dict[str, Field],
+    columns: t.Dict[str, t.Any],
+) -> t.Callable[["Entity", t.Any], None]:
+    # plain fields don't need per instance dispatch: required ones are checked
+    # for presence all at once and defaults are filled in place, only fields
+    # with custom `load` are called one by one
+    required = {}
+    defaults = []
+    loaders = []
+
+    for field in fields.values():
+        if not field.mode & constants.AccessMode.LOAD:
+            continue
+
+        if type(field) is Field:
+            if field.default is ...:
+                required[field.origin] = field
+            else:
+                defaults.append((field.origin, field.default))
+        else:
+            loaders.append((field.origin, field.load))
+
+    required_keys = frozenset(required)
+    defaults = tuple(defaults)
+    loaders = tuple(loaders)
+
+    def load(entity: "Entity", data: t.Any) -> None:
+        if not data.keys() >= required_keys:
+            for origin, field in required.items():
+                if origin not in data:
+                    raise ValueError(
+                        f"No value for field '{field.name}' of entity: {type(entity)}",
+                    )
+
+        for origin, default in defaults:
+            if origin not in data:
+                data[origin] = default()
+
+        for origin, load_field in loaders:
+            value = load_field(data, entity)
+
+            if value is not ...:
+                data[origin] = value
+
+    if not columns:
+        return load
+
+    def load_columns(entity: "Entity", data: t.Any) -> None:
+        load(entity, data)
+        entity._data = entity.storage._get_table(type(entity)).add(entity, data)
+
+    return load_columns
+
+
+_PLAIN, _NESTED, _NESTED_MANY = range(3)
+
+
+def _compile_dumper(
+    fields: t.Dict[str, Field],
+) -> t.Tuple[t.Callable[..., t.Any], t.Callable[..., t.Iterator]]:
+    # fields which are not renamed and always present after loading are left
+    # as is, values of fields with default `__get__` are taken from data
+    # directly, type of every field is resolved here once
+    missing = []
+    steps = []
+
+    for name, field in fields.items():
+        if not field.mode & constants.AccessMode.DUMP:
+            continue
+
+        raw = type(field).__get__ is Field.__get__
+        renamed = field.origin != field.destination
+
+        if isinstance(field, Nested):
+            kind = _NESTED_MANY if field.many else _NESTED
+            raw = type(field).__get__ is Nested.__get__ and not field.lazy
+        elif raw and not renamed:
+            if not field.mode & constants.AccessMode.LOAD:
+                missing.append(field.origin)
+
+            continue
+        else:
+            kind = _PLAIN
+
+        steps.append((kind, name, field.origin, field.destination, raw, renamed))
+
+    missing = tuple(missing)
+    steps = tuple(steps)
+    steps_by_origin = {step[2]: step for step in steps}
+
+    def dump(
+        entity: "Entity",
+        strip_none: bool = False,
+        snapshot: bool = False,
+    ) -> t.Any:
+        data = entity._data
+
+        # data of entities from read only storage is never changed in place
+        if snapshot or type(data) is not dict:
+            data = dict(data)
+
+        if not strip_none:
+            for origin in missing:
+                if origin not in data:
+                    data[origin] = None
+
+        for kind, name, origin, destination, raw, renamed in steps:
+            value = data.get(origin) if raw else getattr(entity, name)
+
+            if value is None:
+                if strip_none:
+                    continue
+            elif kind is _NESTED:
+                value = value.dict(strip_none=strip_none, snapshot=snapshot)
+            elif kind is _NESTED_MANY:
+                value = [
+                    item.dict(strip_none=strip_none, snapshot=snapshot)
+                    for item in value
+                ]
+
+            if renamed:
+                data.pop(origin, None)
+
+            data[destination] = value
+
+        return data
+
+    def iter_dump(
+        entity: "Entity",
+        strip_none: bool = False,
+        path: t.Tuple = (),
+    ) -> t.Iterator[t.Tuple[t.Tuple, t.Any]]:
+        data = entity._data
+        empty = True
+
+        for key, value in data.items():
+            empty = False
+            step = steps_by_origin.get(key)
+
+            if step is None:
+                yield path + (key,), value
+                continue
+
+            kind, name, origin, destination, raw, renamed = step
+
+            if not raw:
+                value = getattr(entity, name)
+
+            if value is None:
+                # same as `dict`, skipped value stays under its origin
+                yield path + (origin if strip_none else destination,), None
+            elif kind is _NESTED:
+                yield from value.iter_dump(strip_none, path + (destination,))
+            elif kind is _NESTED_MANY:
+                if not value:
+                    yield path + (destination,), []
+
+                for i, item in enumerate(value):
+                    yield from item.iter_dump(strip_none, path + (destination, i))
+            else:
+                yield path + (destination,), value
+
+        for kind, name, origin, destination, raw, renamed in steps:
+            if origin not in data:
+                value = None if raw else getattr(entity, name)
+
+                if value is not None or not strip_none:
+                    empty = False
+
+                    yield path + (destination,), value
+
+        if not strip_none:
+            for origin in missing:
+                if origin not in data:
+                    empty = False
+
+                    yield path + (origin,), None
+
+        if empty:
+            yield path, {}
+
+    return dump, iter_dump
+
+
 class EntityMeta(type):
     def __new__(mcs, name, bases, attrs: t.Dict[str, t.Any]):
         fields = {}
@@ -39,12 +226,52 @@ class EntityMeta(type):
 
         attrs["__fields__"] = fields
 
+        config = attrs.get("Config")
+
+        for base in bases:
+            config = config or getattr(base, "Config", None)
+
+        if getattr(config, "slots", False) and "__slots__" not in attrs:
+            if any(
+                isinstance(getattr(base, "_data", None), MemberDescriptorType)
+                for base in bases
+            ):
+                attrs["__slots__"] = ()
+            else:
+                attrs["__slots__"] = ("_data", "storage", "_cache", "__weakref__")
+
         if pk_fields:
             attrs["__pk_fields__"] = pk_fields
 
+        attrs["__tracked__"] = getattr(config, "track", True)
+
+        attrs["__index_fields__"] = tuple(
+            field for field in fields.values() if field.index
+        )
+
         attrs.update(fields)
 
         klass = super().__new__(mcs, name, bases, attrs)
+        klass.__columns__ = {}
+
+        for field in fields.values():
+            # inherited composite keys are resolved by class declaring them
+            if isinstance(field, CompositeKey) and field.owner is klass:
+                field.resolve(fields)
+
+        if getattr(config, "columnar", False):
+            from corm.columnar import get_columns
+
+            # annotations of base classes describe inherited fields
+            all_annotations = {}
+
+            for base in reversed(klass.__mro__):
+                all_annotations.update(base.__dict__.get("__annotations__") or {})
+
+            klass.__columns__ = get_columns(fields, all_annotations)
+
+        klass.__load__ = _compile_loader(fields, klass.__columns__)
+        klass.__dump__, klass.__iter_dump__ = _compile_dumper(fields)
 
         registry.add(klass)
 
@@ -52,43 +279,78 @@ class EntityMeta(type):
 
 
 class Entity(metaclass=EntityMeta):
+    __slots__ = ()
+
     _data: t.Dict[str, t.Any]
     storage: "Storage"
+    # values computed from data, e.g. entities resolved by keys
+    _cache: t.Dict[Field, t.Any]
     __pk_fields__: t.Optional[t.List[Field]] = None
+    __index_fields__: t.Tuple[Field, ...]
+    # entities are kept in registry of storage by type, see `Config.track`
+    __tracked__: bool = True
+    # origins of fields kept in columns of storage -> numpy dtype
+    __columns__: t.Dict[str, t.Any]
     __fields__: t.Dict[str, Field]
+    __load__: t.Callable[["Entity", t.Any], None]
+    __dump__: t.Callable[..., t.Any]
+    __iter_dump__: t.Callable[..., t.Iterator[t.Tuple[t.Tuple, t.Any]]]
 
     def __init__(self, data: t.Any, storage: "Storage"):
-        self._data = data
-        self.storage = storage
+        stats = storage.stats
+
+        # loading is measured once for the outermost entity, nested ones are
+        # loaded inside of it
+        if stats is not None and not stats.measuring("load"):
+            with stats.measure("load"):
+                Entity.__init__(self, data, storage)
 
-        if self.__pk_fields__:
-            storage.add(self)
+            return
 
-        for name, field in self.__fields__.items():
-            if field.mode & constants.AccessMode.LOAD:
-                value = field.load(data, self)
+        self._data = data
+        self.storage = storage
+        storage.add(self)
+        self.__load__(data)
 
-                if value is not ...:
-                    data[field.origin] = value
+        if self.__index_fields__:
+            storage.index(self)
 
-    def dict(self, strip_none=False, hooks: t.Optional[t.List["Hook"]] = None):
-        data = self._data
+    @classmethod
+    def load_many(
+        cls,
+        items: t.Iterable[t.Any],
+        storage: "Storage",
+    ) -> t.List["Entity"]:
+        return storage.load_many(cls, items)
 
-        for name, field in self.__fields__.items():
-            if field.mode & constants.AccessMode.DUMP:
-                value = getattr(self, name)
+    def dict(
+        self,
+        strip_none=False,
+        hooks: t.Optional[t.List["Hook"]] = None,
+        snapshot: bool = False,
+    ):
+        """Dump entity data
 
-                if strip_none and value is None:
-                    continue
+        By default data of entity is changed in place and returned, with
+        `snapshot=True` new structure is built and entity data is left as is.
+        Values which aren't described by fields are not copied.
+        """
+        stats = self.storage.stats
 
-                if isinstance(field, Nested):
-                    if field.many:
-                        value = [item.dict(strip_none=strip_none) for item in value]
-                    else:
-                        value = value.dict(strip_none=strip_none)
+        if stats is not None:
+            with stats.measure("dump"):
+                return self.__dump__(strip_none, snapshot)
 
-                data.pop(field.origin, None)  # TODO: temporary solution
+        return self.__dump__(strip_none, snapshot)
 
-                data[field.destination] = value
+    def iter_dump(
+        self,
+        strip_none: bool = False,
+        path: t.Tuple = (),
+    ) -> t.Iterator[t.Tuple[t.Tuple, t.Any]]:
+        """Lazily dump entity as `(path, value)` pairs
 
-        return data
+        Path is a tuple of keys and list indexes leading to the value in the
+        structure `dict(snapshot=True)` would return. Entity data isn't changed.
+        """
+        return self.__iter_dump__(strip_none, path)
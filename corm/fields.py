@@ -1,7 +1,8 @@
+import itertools
 import typing as t
 
 from corm import registry
-from corm.constants import RelationType, AccessMode
+from corm.constants import RelationType, AccessMode, IndexType
 
 if t.TYPE_CHECKING:
     from corm.entity import Entity
@@ -35,6 +36,13 @@ class DefaultKeyManager:
             return getattr(entity, self.field.name)
 
 
+class CompositeKeyManager(DefaultKeyManager):
+    """Keys of composite key fields are kept as sequences of values"""
+
+    def get(self, data):
+        return data if isinstance(data, tuple) else tuple(data)
+
+
 class RelationshipList(list):
     def __init__(
         self,
@@ -80,12 +88,6 @@ class RelationshipList(list):
         if self.relation_type:
             self.remove_relation(entity)
 
-    def insert(self, index: int, entity: "Entity") -> None:
-        raise NotImplementedError
-
-    def pop(self, index: int = ...) -> "Entity":
-        raise NotImplementedError
-
     def clear(self) -> None:
         if self.relation_type:
             for entity in self:
@@ -130,6 +132,93 @@ class NestedList(RelationshipList):
         )
 
 
+class RelationshipView:
+    """Live view of entities related to entity
+
+    Nothing is copied on creation, every operation goes to storage. Iteration
+    goes over entities related at its start, so they can be removed meanwhile.
+    Order of entities is order of relations, so view is append only: entities
+    can't be inserted at position, access by index walks over relations.
+    """
+
+    def __init__(
+        self,
+        entity: "Entity",
+        entity_type: t.Type["Entity"],
+        relation_type: t.Any,
+    ):
+        self.entity = entity
+        self.entity_type = entity_type
+        self.relation_type = relation_type
+
+    def _get_entities(self) -> t.Collection["Entity"]:
+        return self.entity.storage.view_related_entities(
+            self.entity,
+            self.entity_type,
+            self.relation_type,
+        )
+
+    def __iter__(self) -> t.Iterator["Entity"]:
+        # entities can be removed from view while it is iterated
+        return iter(tuple(self._get_entities()))
+
+    def __len__(self) -> int:
+        return len(self._get_entities())
+
+    def __contains__(self, entity: "Entity") -> bool:
+        return entity in self._get_entities()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+
+        entities = self._get_entities()
+
+        if index < 0:
+            index += len(entities)
+
+        if 0 <= index < len(entities):
+            return next(itertools.islice(entities, index, None))
+
+        raise IndexError("index out of range")
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, RelationshipView)):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, entity: "Entity") -> None:
+        self.entity.storage.make_relation(
+            from_=self.entity,
+            to_=entity,
+            relation_type=self.relation_type,
+        )
+
+    def extend(self, entities: t.Iterable["Entity"]) -> None:
+        for entity in entities:
+            self.append(entity)
+
+    def remove(self, entity: "Entity") -> None:
+        self.entity.storage.remove_relation(
+            from_=self.entity,
+            to_=entity,
+            relation_type=self.relation_type,
+        )
+
+    def clear(self) -> None:
+        self.entity.storage.remove_relations(
+            self.entity,
+            self.entity_type,
+            self.relation_type,
+        )
+
+
 class KeyRelationshipList(list):
     """TODO"""
 
@@ -137,10 +226,13 @@ class KeyRelationshipList(list):
 class Field:
     name: str
     pk: bool
+    index: t.Union[bool, IndexType]
     mode: int
     default: t.Callable[[], t.Any]
     origin: t.Optional[str]
     destination: t.Optional[str]
+    # composite keys made of this field, they are updated when it's set
+    composite_keys: t.Tuple["CompositeKey", ...] = ()
 
     def __init__(
         self,
@@ -149,8 +241,13 @@ class Field:
         default: t.Union[t.Any, t.Callable[[], t.Any]] = ...,
         origin: t.Optional[str] = None,
         destination: t.Optional[str] = None,
+        index: t.Union[bool, IndexType] = False,
     ):
+        if isinstance(index, bool) and index:
+            index = IndexType.HASH
+
         self.pk = pk
+        self.index = index
         self.mode = mode
         self.origin = origin
         self.destination = destination
@@ -169,7 +266,24 @@ class Field:
     def __set__(self, instance: "Entity", value):
         if instance:
             if self.mode & AccessMode.SET:
+                if self.pk or self.index:
+                    instance.storage.update_index(
+                        instance,
+                        self,
+                        instance._data.get(self.origin),
+                        value,
+                    )
+
+                for key in self.composite_keys:
+                    key.update(instance, self, value)
+
                 instance._data[self.origin] = value
+
+                # values extracted for batch evaluation are outdated
+                column_cache = instance.storage._column_cache
+
+                if column_cache:
+                    column_cache.pop(self, None)
             else:
                 raise ValueError(f"Field '{self.name}' is read only")
         else:
@@ -202,6 +316,67 @@ class Field:
         return f"<Field[{self.owner.__name__}.{self.name}]>"
 
 
+class CompositeKey(Field):
+    """Primary key made of values of several fields of entity
+
+    Value is a tuple of values of the fields in the same order, entity is
+    found by it with a single lookup, e.g. `storage.get(User.key, (1, 2))`.
+    """
+
+    def __init__(self, *names: str):
+        if len(names) < 2:
+            raise ValueError("Composite key should consist of at least two fields")
+
+        super().__init__(pk=True, mode=AccessMode.GET)
+
+        self.names = names
+        self.fields: t.Tuple[Field, ...] = ()
+        self._origins: t.Tuple[str, ...] = ()
+
+    def resolve(self, fields: t.Dict[str, Field]):
+        # called once fields of entity are named
+        components = []
+
+        for name in self.names:
+            field = fields.get(name)
+
+            if field is None:
+                raise ValueError(
+                    f"Entity {self.owner.__name__} has no field '{name}' "
+                    f"for composite key '{self.name}'",
+                )
+
+            if type(field) is not Field:
+                raise ValueError(f"{field} can't be part of composite key")
+
+            if self not in field.composite_keys:
+                field.composite_keys += (self,)
+
+            components.append(field)
+
+        self.fields = tuple(components)
+        self._origins = tuple(field.origin for field in components)
+
+    def __get__(self, instance: "Entity", owner) -> t.Any:
+        if instance:
+            data = instance._data
+
+            return tuple([data.get(origin) for origin in self._origins])
+        else:
+            return self
+
+    def update(self, instance: "Entity", field: Field, value: t.Any):
+        old_value = self.__get__(instance, None)
+        new_value = tuple(
+            [
+                value if component is field else item
+                for component, item in zip(self.fields, old_value)
+            ],
+        )
+
+        instance.storage.update_index(instance, self, old_value, new_value)
+
+
 class Nested(Field):
     def __init__(
         self,
@@ -212,6 +387,7 @@ class Nested(Field):
         default: t.Union[t.Any, t.Callable[[], t.Any]] = ...,
         origin: str = None,
         destination: str = None,
+        lazy: bool = False,
     ):
         super().__init__(
             mode=mode,
@@ -226,6 +402,7 @@ class Nested(Field):
         self._entity_type = entity_type
         self.many = many
         self.back_relation = back_relation
+        self.lazy = lazy
 
     @property
     def entity_type(self) -> t.Type["Entity"]:
@@ -239,8 +416,21 @@ class Nested(Field):
 
         return entity
 
-    def load(self, data, instance: "Entity") -> t.NoReturn:
+    def load(self, data, instance: "Entity") -> t.Any:
         data = super().load(data, instance)
+
+        if self.lazy:
+            instance.storage.defer(instance, self)
+
+            return data
+
+        return self._build(data, instance)
+
+    def materialize(self, instance: "Entity"):
+        data = instance._data
+        data[self.origin] = self._build(data.get(self.origin), instance)
+
+    def _build(self, data: t.Any, instance: "Entity") -> t.Any:
         storage = instance.storage
 
         if self.many:
@@ -263,6 +453,12 @@ class Nested(Field):
 
         return data
 
+    def __get__(self, instance: "Entity", owner) -> t.Any:
+        if instance and self.lazy:
+            instance.storage.resolve(instance, self)
+
+        return super().__get__(instance, owner)
+
     def __set__(
         self,
         instance: "Entity",
@@ -329,15 +525,9 @@ class Relationship(Field):
             return super().__get__(instance, owner)
 
         if self.many:
-            entities = instance.storage.get_related_entities(
-                instance,
-                self.entity_type,
-                self.relation_type,
-            )
-
-            return RelationshipList(
+            return RelationshipView(
                 entity=instance,
-                items=entities,
+                entity_type=self.entity_type,
                 relation_type=self.relation_type,
             )
         else:
@@ -351,6 +541,10 @@ class Relationship(Field):
         if not instance:
             return super().__set__(instance, value)
 
+        if self.many and value:
+            # value can be view of the same relations
+            value = list(value)
+
         instance.storage.remove_relations(
             instance,
             self.entity_type,
@@ -385,6 +579,7 @@ class KeyNested(Field):
         destination: t.Optional[str] = None,
         key_manager: t.Optional[KeyManager] = None,
         required: bool = True,
+        reverse_index: bool = False,
     ):
         if not related_entity_field.pk:
             raise ValueError(
@@ -402,14 +597,33 @@ class KeyNested(Field):
             back_relation = RelationType.RELATED
 
         self.related_entity_field = related_entity_field
-        self.key_manager = key_manager or DefaultKeyManager(
-            field=related_entity_field,
-        )
+        if key_manager is None:
+            if isinstance(related_entity_field, CompositeKey):
+                key_manager = CompositeKeyManager(field=related_entity_field)
+            else:
+                key_manager = DefaultKeyManager(field=related_entity_field)
+
+        self.key_manager = key_manager
         self.many = many
         self.back_relation = back_relation
         self.required = required
+        # storage keeps entities referencing each key, see `get_referencing`
+        self.reverse_index = reverse_index
+
+    def get_keys(self, data: t.Any) -> t.List[t.Any]:
+        """Keys of related entities in raw value of field"""
+        if data is None:
+            return []
+
+        if self.many:
+            return [self.key_manager.get(item) for item in data]
+
+        return [self.key_manager.get(data)]
 
     def _load_one(self, data: t.Any, storage: "Storage", parent: "Entity"):
+        if self.reverse_index:
+            storage.add_reference(self, data, parent)
+
         if self.back_relation:
             storage.make_key_relation(
                 field_from=self.related_entity_field,
@@ -436,9 +650,37 @@ class KeyNested(Field):
         return data
 
     def __get__(self, instance: "Entity", owner):
-        data = super().__get__(instance, owner)
+        if not instance:
+            return self
 
-        if not instance or data is None:
+        # resolved value is cached until key is changed through this field or
+        # entities in storage are added or removed
+        version = instance.storage.version
+        cache = getattr(instance, "_cache", None)
+
+        if cache is not None:
+            cached = cache.get(self)
+
+            if cached is not None and cached[0] == version:
+                value = cached[1]
+
+                # every read gets own list, changing it doesn't affect cache
+                return list(value) if self.many and value is not None else value
+
+        value = self._resolve(instance, super().__get__(instance, owner))
+
+        if cache is None:
+            cache = instance._cache = {}
+
+        if self.many and value is not None:
+            cache[self] = version, tuple(value)
+        else:
+            cache[self] = version, value
+
+        return value
+
+    def _resolve(self, instance: "Entity", data: t.Any) -> t.Any:
+        if data is None:
             return data
 
         if self.many:
@@ -483,6 +725,10 @@ class KeyNested(Field):
         if not instance:
             return super().__set__(instance, value)
 
+        if self.reverse_index:
+            for key in self.get_keys(instance._data.get(self.origin)):
+                instance.storage.remove_reference(self, key, instance)
+
         if self.many:
             if self.back_relation:
                 for old_related_entity in getattr(instance, self.name):
@@ -525,3 +771,12 @@ class KeyNested(Field):
                 )
 
         super().__set__(instance, new_data)
+
+        if self.reverse_index:
+            for key in self.get_keys(new_data):
+                instance.storage.add_reference(self, key, instance)
+
+        cache = getattr(instance, "_cache", None)
+
+        if cache:
+            cache.pop(self, None)
@@ -0,0 +1,259 @@
+import bisect
+import operator
+import typing as t
+import weakref
+
+from collections.abc import MutableMapping
+
+if t.TYPE_CHECKING:
+    from corm.entity import Entity
+    from corm.fields import Field
+
+
+class WeakBucket(MutableMapping):
+    """Weak set of entities, `on_empty` is called when last of them is gone"""
+
+    def __init__(self, on_empty: t.Callable[["WeakBucket"], None]):
+        # weak reference -> None, reference is equal to its entity while
+        # entity is alive, so it is found by new reference to entity
+        self._refs: t.Dict[weakref.ref, None] = {}
+        bucket_ref = weakref.ref(self)
+
+        def on_dead(ref: weakref.ref):
+            bucket = bucket_ref()
+
+            # dead reference is still found by itself
+            if bucket is None or ref not in bucket._refs:
+                return
+
+            del bucket._refs[ref]
+
+            if not bucket._refs:
+                on_empty(bucket)
+
+        self._on_dead = on_dead
+
+    def __getitem__(self, entity: "Entity") -> None:
+        return self._refs[weakref.ref(entity)]
+
+    def __setitem__(self, entity: "Entity", value: None):
+        self._refs[weakref.ref(entity, self._on_dead)] = value
+
+    def __delitem__(self, entity: "Entity"):
+        del self._refs[weakref.ref(entity)]
+
+    def __contains__(self, entity: t.Any) -> bool:
+        try:
+            return weakref.ref(entity) in self._refs
+        except TypeError:
+            return False
+
+    def __iter__(self) -> t.Iterator["Entity"]:
+        # references are copied, entities may die while they are iterated
+        for ref in list(self._refs):
+            entity = ref()
+
+            if entity is not None:
+                yield entity
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def clear(self):
+        self._refs.clear()
+
+
+def make_weak_bucket(container: t.Dict[t.Any, t.Any], key: t.Any) -> WeakBucket:
+    """Bucket which is removed from container when it becomes empty"""
+
+    def on_empty(bucket: WeakBucket):
+        if container.get(key) is bucket:
+            del container[key]
+
+    return WeakBucket(on_empty)
+
+
+class HashIndex:
+    def __init__(self, field: "Field", weak: bool = False):
+        self.field = field
+        self.weak = weak
+        # value -> entities, dicts are used as insertion ordered sets
+        self._entries: t.Dict[t.Any, t.Dict["Entity", None]] = {}
+
+    def add(self, entity: "Entity", value: t.Any):
+        entities = self._entries.get(value)
+
+        if entities is None:
+            entities = self._entries[value] = (
+                make_weak_bucket(self._entries, value) if self.weak else {}
+            )
+
+        entities[entity] = None
+
+    def remove(self, entity: "Entity", value: t.Any):
+        entities = self._entries.get(value)
+
+        if entities is not None:
+            entities.pop(entity, None)
+
+            if not entities:
+                del self._entries[value]
+
+    def get(self, value: t.Any) -> t.Collection["Entity"]:
+        return self._entries.get(value, ())
+
+    def entities(self) -> t.List["Entity"]:
+        return [entity for entities in self._entries.values() for entity in entities]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SortedIndex:
+    def __init__(self, field: "Field", weak: bool = False):
+        self.field = field
+        self.weak = weak
+        self._keys: t.List[t.Any] = []
+        # in weak mode there are weak references to entities instead
+        self._entities: t.List[t.Any] = []
+        # added values are sorted in on first read, so loading many entities
+        # costs one sort instead of insertion into the middle of list each time
+        self._pending: t.List[t.Tuple[t.Any, t.Any]] = []
+        # None isn't comparable with other values
+        self._nones: t.Dict["Entity", None] = (
+            weakref.WeakKeyDictionary() if weak else {}
+        )
+        self._dead = 0
+
+    def _on_dead(self, ref: weakref.ref):
+        self._dead += 1
+
+    def _has_dead(self) -> bool:
+        # references to dead entities are dropped once they are half of all
+        return self._dead * 2 > len(self._keys) + len(self._pending)
+
+    def _compact(self):
+        items = [
+            (value, ref)
+            for value, ref in zip(self._keys, self._entities)
+            if ref() is not None
+        ]
+        self._keys = [value for value, _ in items]
+        self._entities = [ref for _, ref in items]
+        self._pending = [
+            (value, ref) for value, ref in self._pending if ref() is not None
+        ]
+        self._dead = 0
+
+    def _flush(self):
+        if self._has_dead():
+            self._compact()
+
+        pending = self._pending
+
+        if len(pending) < 64:
+            for value, entity in pending:
+                i = bisect.bisect_right(self._keys, value)
+                self._keys.insert(i, value)
+                self._entities.insert(i, entity)
+        else:
+            items = list(zip(self._keys, self._entities))
+            items.extend(pending)
+            items.sort(key=operator.itemgetter(0))
+            self._keys = [value for value, _ in items]
+            self._entities = [entity for _, entity in items]
+
+        self._pending.clear()
+
+    def add(self, entity: "Entity", value: t.Any):
+        if value is None:
+            self._nones[entity] = None
+        else:
+            if self.weak:
+                entity = weakref.ref(entity, self._on_dead)
+
+                # entities can be only added for a long time without reads
+                if self._dead > 64 and self._has_dead():
+                    self._compact()
+
+            self._pending.append((value, entity))
+
+    def remove(self, entity: "Entity", value: t.Any):
+        if value is None:
+            self._nones.pop(entity, None)
+            return
+
+        if self._pending:
+            self._flush()
+
+        i = bisect.bisect_left(self._keys, value)
+        j = bisect.bisect_right(self._keys, value, lo=i)
+
+        for k in range(i, j):
+            item = self._entities[k]
+
+            if (item() if self.weak else item) is entity:
+                del self._keys[k]
+                del self._entities[k]
+                break
+
+    def bounds(
+        self,
+        lower: t.Any = None,
+        lower_inclusive: bool = True,
+        upper: t.Any = None,
+        upper_inclusive: bool = True,
+    ) -> t.Tuple[int, int]:
+        if self._pending or self._has_dead():
+            self._flush()
+
+        keys = self._keys
+
+        if lower is None:
+            i = 0
+        elif lower_inclusive:
+            i = bisect.bisect_left(keys, lower)
+        else:
+            i = bisect.bisect_right(keys, lower)
+
+        if upper is None:
+            j = len(keys)
+        elif upper_inclusive:
+            j = bisect.bisect_right(keys, upper, lo=i)
+        else:
+            j = bisect.bisect_left(keys, upper, lo=i)
+
+        return i, max(i, j)
+
+    def iter_range(
+        self,
+        i: int,
+        j: int,
+        reverse: bool = False,
+    ) -> t.Iterator["Entity"]:
+        # slice is copied, so entities can be reindexed while they are iterated
+        entities = self._entities[i:j]
+
+        if reverse:
+            entities.reverse()
+
+        if self.weak:
+            entities = [ref() for ref in entities]
+            entities = [entity for entity in entities if entity is not None]
+
+        return iter(entities)
+
+    def get(self, value: t.Any) -> t.Collection["Entity"]:
+        if value is None:
+            return list(self._nones)
+
+        return list(self.iter_range(*self.bounds(value, True, value, True)))
+
+    def get_nones(self) -> t.Collection["Entity"]:
+        return self._nones
+
+    def entities(self) -> t.List["Entity"]:
+        return [*self.iter_range(*self.bounds()), *self._nones]
+
+    def __len__(self):
+        return len(self._keys) + len(self._pending) + len(self._nones) - self._dead
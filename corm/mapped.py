@@ -0,0 +1,263 @@
+import mmap
+import os
+import typing as t
+import weakref
+
+from collections.abc import Mapping
+
+from corm import snapshot
+from corm.storage import EntityRef, Storage
+
+if t.TYPE_CHECKING:
+    import numpy as np
+
+    from corm.entity import Entity
+    from corm.fields import Field, KeyNested
+
+
+class EntityData(Mapping):
+    """Data of entity decoded from snapshot on first access"""
+
+    __slots__ = ("storage", "entity_id", "_data")
+
+    def __init__(self, storage: "MappedStorage", entity_id: int):
+        self.storage = storage
+        self.entity_id = entity_id
+        self._data = None
+
+    @property
+    def data(self) -> t.Dict[str, t.Any]:
+        if self._data is None:
+            self._data = self.storage._decode(self.entity_id)
+
+        return self._data
+
+    def __getitem__(self, key: str) -> t.Any:
+        return self.data[key]
+
+    def get(self, key: str, default: t.Any = None) -> t.Any:
+        return self.data.get(key, default)
+
+    def __contains__(self, key: t.Any) -> bool:
+        return key in self.data
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __setitem__(self, key: str, value: t.Any):
+        raise ValueError("Storage is read only")
+
+    def __repr__(self) -> str:
+        return repr(self.data)
+
+
+class MappedStorage(Storage):
+    """Read only storage working straight on top of snapshot
+
+    Snapshot is made by `Storage.dump` and can be in memory mapped file or
+    in any other buffer, e.g. shared memory. Entities are created on demand
+    and their data is decoded on first access, so processes sharing the
+    same file share one copy of it. Data is unpickled, so snapshot should
+    come from trusted source only.
+    """
+
+    def __init__(self, buffer: t.Union[bytes, memoryview, mmap.mmap]):
+        super().__init__(weak=True)
+
+        self._reader = snapshot.Reader(buffer)
+
+        if self._reader.deferred:
+            raise ValueError(
+                "Snapshot has lazy fields which are not loaded, "
+                "call resolve_all before dump",
+            )
+
+        self._file = None
+        self._shells: t.MutableMapping[int, "Entity"] = weakref.WeakValueDictionary()
+        self._edge_key_ids = {
+            edge_key: i for i, edge_key in enumerate(self._reader.edge_keys)
+        }
+        self._persistent_load = snapshot.make_persistent_load(
+            self._get_entity,
+            self._reader.relation_types,
+        )
+
+    @classmethod
+    def open(cls, path: t.Union[str, os.PathLike]) -> "MappedStorage":
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            storage = cls(buffer)
+        except Exception:
+            buffer.close()
+            raise
+
+        storage._file = buffer
+
+        return storage
+
+    @classmethod
+    def load(cls, path: t.Union[str, os.PathLike]) -> "MappedStorage":
+        return cls.open(path)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "MappedStorage":
+        return cls(data)
+
+    def close(self):
+        self._shells.clear()
+        self._reader.close()
+
+        if self._file is not None:
+            self._file.close()
+
+    def _get_entity(self, entity_id: int) -> "Entity":
+        entity = self._shells.get(entity_id)
+
+        if entity is None:
+            entity_type = self._reader.get_type(entity_id)
+            entity = entity_type.__new__(entity_type)
+            entity.storage = self
+            entity._data = EntityData(self, entity_id)
+            self._shells[entity_id] = entity
+
+        return entity
+
+    def _decode(self, entity_id: int) -> t.Dict[str, t.Any]:
+        return snapshot.decode(
+            self._reader.get_payload(entity_id),
+            self._reader.refs[entity_id],
+            self._persistent_load,
+        )
+
+    def _read_only(self, *args, **kwargs) -> t.NoReturn:
+        raise ValueError("Storage is read only")
+
+    add = add_many = remove = index = update_index = _read_only
+    add_reference = remove_reference = _read_only
+    load_many = make_key_relation = make_relation = _read_only
+    remove_relation = remove_relations = defer = merge = _read_only
+
+    def get(self, field: "Field", entity_key: t.Any) -> t.Optional["Entity"]:
+        # hashes can collide, found entities are checked by real key
+        for entity_id in self._reader.find_key(field, entity_key):
+            entity = self._get_entity(entity_id)
+
+            if getattr(entity, field.name) == entity_key:
+                return entity
+
+        return None
+
+    def get_entities(self, entity_type: t.Type["Entity"]) -> t.Iterator["Entity"]:
+        types = [issubclass(type_, entity_type) for type_ in self._reader.types]
+
+        for entity_id, type_id in enumerate(self._reader.type_ids):
+            if types[type_id]:
+                yield self._get_entity(entity_id)
+
+    def unresolved(self) -> t.List[EntityRef]:
+        return [
+            EntityRef(snapshot.get_field(field_ref), key)
+            for field_ref, key, buckets in self._reader.pending
+            if any(related_ids for _, related_ids in buckets)
+        ]
+
+    def get_referencing(
+        self,
+        field: "KeyNested",
+        target: t.Union["Entity", t.Any],
+    ) -> t.List["Entity"]:
+        # there is no reverse index in snapshot, entities are scanned
+        if not getattr(field, "reverse_index", False):
+            raise ValueError(f"{field} has no reverse index")
+
+        related_field = field.related_entity_field
+
+        if isinstance(target, related_field.owner):
+            target = getattr(target, related_field.name)
+
+        return [
+            entity
+            for entity in self.get_entities(field.owner)
+            if target in field.get_keys(entity._data.get(field.origin))
+        ]
+
+    def column(self, field: "Field") -> "np.ndarray":
+        # there are no columns in snapshot, they are built from entities
+        import numpy as np
+
+        if field.origin not in field.owner.__columns__:
+            raise ValueError(f"{field} is not column field")
+
+        return np.array(
+            [
+                getattr(entity, field.name)
+                for entity in self.column_entities(field.owner)
+            ],
+            dtype=field.owner.__columns__[field.origin],
+        )
+
+    def column_entities(self, entity_type: t.Type["Entity"]) -> t.List["Entity"]:
+        return [
+            entity for entity in self.get_entities(entity_type) if entity.__columns__
+        ]
+
+    def _get_entity_id(self, entity: "Entity") -> int:
+        data = getattr(entity, "_data", None)
+
+        if not isinstance(data, EntityData) or data.storage is not self:
+            raise ValueError(f"{entity} is not in storage")
+
+        return data.entity_id
+
+    def get_related_entities(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        related_entity_type: t.Type["Entity"],
+        relation_type: t.Any,
+    ) -> t.List["Entity"]:
+        edge_key_id = self._edge_key_ids.get((related_entity_type, relation_type))
+
+        if edge_key_id is None:
+            return []
+
+        if isinstance(entity, EntityRef):
+            # relations by keys which entities were never loaded
+            for field_ref, key, buckets in self._reader.pending:
+                if key == entity.key and snapshot.get_field(field_ref) is entity.field:
+                    for bucket_key_id, related_ids in buckets:
+                        if bucket_key_id == edge_key_id:
+                            return [self._get_entity(i) for i in related_ids]
+
+            return []
+
+        return [
+            self._get_entity(related_id)
+            for key_id, related_id in self._reader.iter_edges(
+                self._get_entity_id(entity),
+            )
+            if key_id == edge_key_id
+        ]
+
+    view_related_entities = get_related_entities
+
+    def get_one_related_entity(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        related_entity_type: t.Type["Entity"],
+        relation_type: t.Any,
+    ) -> t.Optional["Entity"]:
+        entities = self.get_related_entities(entity, related_entity_type, relation_type)
+
+        return entities[0] if entities else None
+
+    def dump(self, path: t.Union[str, os.PathLike]):
+        with open(path, "wb") as file:
+            file.write(self._reader.buffer)
+
+    def dumps(self) -> bytes:
+        return bytes(self._reader.buffer)
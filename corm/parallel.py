@@ -0,0 +1,78 @@
+import collections
+import concurrent.futures
+import importlib
+import io
+import itertools
+import os
+import typing as t
+
+from corm import registry, snapshot
+from corm.storage import Storage
+
+if t.TYPE_CHECKING:
+    from corm.entity import Entity
+
+
+def _load_chunk(
+    module: str,
+    type_name: str,
+    items: t.List[t.Any],
+) -> t.Tuple[bytes, t.List[int]]:
+    # entity classes aren't there in new process until module is imported
+    importlib.import_module(module)
+
+    storage = Storage()
+    entities = storage.load_many(registry.get(type_name), items)
+    file = io.BytesIO()
+    ids = snapshot.write(storage, file)
+
+    return file.getvalue(), [ids[entity] for entity in entities]
+
+
+def _iter_chunks(
+    items: t.Iterable[t.Any],
+    chunk_size: int,
+) -> t.Iterator[t.List[t.Any]]:
+    items = iter(items)
+
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def parallel_load(
+    storage: Storage,
+    entity_type: t.Type["Entity"],
+    items: t.Iterable[t.Any],
+    workers: t.Optional[int] = None,
+    chunk_size: int = 10000,
+) -> t.List["Entity"]:
+    workers = workers or os.cpu_count() or 1
+    module = entity_type.__module__
+    type_name = snapshot.get_type_name(entity_type)
+    # only few chunks are sent ahead, so input isn't read into memory at once
+    futures = collections.deque()
+    entities = []
+
+    def merge(future):
+        data, ids = future.result()
+        # restoring into storage merges chunk with entities loaded before
+        loaded = snapshot.loads(storage, data)
+        entities.extend(loaded[i] for i in ids)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _iter_chunks(items, chunk_size):
+            futures.append(executor.submit(_load_chunk, module, type_name, chunk))
+
+            # chunks are merged in order of input
+            if len(futures) >= workers * 2:
+                merge(futures.popleft())
+
+        while futures:
+            merge(futures.popleft())
+
+    return entities
@@ -0,0 +1,281 @@
+import heapq
+import itertools
+import operator
+import typing as t
+
+from corm.index import SortedIndex
+
+if t.TYPE_CHECKING:
+    from corm.entity import Entity
+    from corm.fields import Field
+    from corm.storage import Storage
+
+
+def _between(value, bounds):
+    return bounds[0] <= value <= bounds[1]
+
+
+def _in(value, values):
+    return value in values
+
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "in": _in,
+    "between": _between,
+}
+ORDERING_OPERATORS = {"lt", "le", "gt", "ge", "between"}
+
+
+class Query:
+    def __init__(
+        self,
+        storage: "Storage",
+        entity_type: t.Type["Entity"],
+        conditions: t.Tuple[t.Tuple["Field", str, t.Any], ...] = (),
+        predicates: t.Tuple[t.Callable[["Entity"], bool], ...] = (),
+        order: t.Optional[t.Tuple["Field", bool]] = None,
+        limit: t.Optional[int] = None,
+    ):
+        self.storage = storage
+        self.entity_type = entity_type
+        self._conditions = conditions
+        self._predicates = predicates
+        self._order = order
+        self._limit = limit
+
+    def _get_field(self, name: str) -> "Field":
+        try:
+            return self.entity_type.__fields__[name]
+        except KeyError:
+            raise ValueError(
+                f"Entity {self.entity_type.__name__} has no field '{name}'",
+            ) from None
+
+    def _copy(self, **kwargs) -> "Query":
+        params = {
+            "storage": self.storage,
+            "entity_type": self.entity_type,
+            "conditions": self._conditions,
+            "predicates": self._predicates,
+            "order": self._order,
+            "limit": self._limit,
+        }
+        params.update(kwargs)
+
+        return Query(**params)
+
+    def filter(self, *args, **kwargs) -> "Query":
+        """Filter entities
+
+        Keyword arguments are `field=value` or `field__operator=value` where
+        operator is one of `eq`, `ne`, `lt`, `le`, `gt`, `ge`, `in` and
+        `between` (value is a pair of inclusive bounds), positional arguments
+        are callables accepting entity.
+        """
+        for predicate in args:
+            if not callable(predicate):
+                raise ValueError(f"Predicate should be callable, got: {predicate}")
+
+        conditions = []
+
+        for key, value in kwargs.items():
+            name, _, operator_name = key.partition("__")
+            operator_name = operator_name or "eq"
+
+            if operator_name not in OPERATORS:
+                raise ValueError(f"Unknown operator '{operator_name}'")
+
+            conditions.append((self._get_field(name), operator_name, value))
+
+        return self._copy(
+            conditions=self._conditions + tuple(conditions),
+            predicates=self._predicates + args,
+        )
+
+    def order_by(self, name: str) -> "Query":
+        """Order entities by field, prefix `-` means descending order
+
+        Entities with None value go last.
+        """
+        reverse = name.startswith("-")
+
+        return self._copy(order=(self._get_field(name.lstrip("-")), reverse))
+
+    def limit(self, limit: t.Optional[int]) -> "Query":
+        return self._copy(limit=limit)
+
+    def _get_bounds(self, field: "Field") -> t.Optional[t.Tuple]:
+        lower = upper = None
+        lower_inclusive = upper_inclusive = True
+        found = False
+
+        for condition_field, operator_name, value in self._conditions:
+            if condition_field is not field:
+                continue
+
+            if operator_name == "eq" and value is not None:
+                low, high = value, value
+            elif operator_name == "between":
+                low, high = value
+            else:
+                low = high = None
+
+            if operator_name in ("gt", "ge"):
+                low = value
+            elif operator_name in ("lt", "le"):
+                high = value
+
+            if low is not None:
+                inclusive = operator_name != "gt"
+
+                if lower is None or low > lower or (low == lower and not inclusive):
+                    lower, lower_inclusive = low, inclusive
+
+                found = True
+
+            if high is not None:
+                inclusive = operator_name != "lt"
+
+                if upper is None or high < upper or (high == upper and not inclusive):
+                    upper, upper_inclusive = high, inclusive
+
+                found = True
+
+        if found:
+            return lower, lower_inclusive, upper, upper_inclusive
+
+    def _get_candidates(self) -> t.Tuple[t.Iterable["Entity"], bool]:
+        # returns smallest set of entities which can match conditions and
+        # whether these entities are already in requested order
+        candidates = None
+        size = None
+        ordered = False
+
+        for field, operator_name, value in self._conditions:
+            if field.pk and operator_name in ("eq", "in"):
+                values = (value,) if operator_name == "eq" else value
+                entities = [self.storage.get(field, item) for item in values]
+
+                return [entity for entity in entities if entity is not None], False
+
+            index = self.storage.get_index(field)
+
+            if index is None:
+                continue
+
+            if isinstance(index, SortedIndex):
+                bounds = self._get_bounds(field)
+
+                if bounds is None:
+                    continue
+
+                i, j = index.bounds(*bounds)
+
+                if size is None or j - i < size:
+                    size = j - i
+                    ordered = bool(self._order) and self._order[0] is field
+                    candidates = index.iter_range(
+                        i,
+                        j,
+                        reverse=ordered and self._order[1],
+                    )
+            elif operator_name in ("eq", "in"):
+                values = (value,) if operator_name == "eq" else value
+                entities = {}
+
+                for item in values:
+                    entities.update(dict.fromkeys(index.get(item)))
+
+                if size is None or len(entities) < size:
+                    candidates, size, ordered = entities, len(entities), False
+
+        if candidates is None and self._order:
+            field, reverse = self._order
+            index = self.storage.get_index(field)
+
+            if isinstance(index, SortedIndex):
+                i, j = index.bounds()
+                entities = index.iter_range(i, j, reverse)
+
+                return itertools.chain(entities, list(index.get_nones())), True
+
+        if candidates is None:
+            return self.storage.get_entities(self.entity_type), False
+
+        return candidates, ordered
+
+    def _filter(self, entities: t.Iterable["Entity"]) -> t.Iterator["Entity"]:
+        entity_type = self.entity_type
+        conditions = [
+            (field.name, OPERATORS[operator_name], value, operator_name)
+            for field, operator_name, value in self._conditions
+        ]
+        predicates = self._predicates
+
+        for entity in entities:
+            if not isinstance(entity, entity_type):
+                continue
+
+            for name, compare, value, operator_name in conditions:
+                entity_value = getattr(entity, name)
+
+                if entity_value is None and operator_name in ORDERING_OPERATORS:
+                    break
+
+                if not compare(entity_value, value):
+                    break
+            else:
+                for predicate in predicates:
+                    if not predicate(entity):
+                        break
+                else:
+                    yield entity
+
+    def __iter__(self) -> t.Iterator["Entity"]:
+        candidates, ordered = self._get_candidates()
+        entities = self._filter(candidates)
+
+        if self._order and not ordered:
+            name = self._order[0].name
+            # entities without value go last in both directions
+            is_last = operator.is_not if self._order[1] else operator.is_
+
+            def key(entity):
+                value = getattr(entity, name)
+
+                return is_last(value, None), value
+
+            if self._limit is None:
+                entities = sorted(entities, key=key, reverse=self._order[1])
+            elif self._order[1]:
+                entities = heapq.nlargest(self._limit, entities, key=key)
+            else:
+                entities = heapq.nsmallest(self._limit, entities, key=key)
+
+        if self._limit is not None:
+            entities = itertools.islice(entities, self._limit)
+
+        return iter(entities)
+
+    def first(self) -> t.Optional["Entity"]:
+        return next(iter(self.limit(1)), None)
+
+    def one(self) -> "Entity":
+        entities = list(itertools.islice(self, 2))
+
+        if len(entities) != 1:
+            raise ValueError(
+                f"Expected exactly one {self.entity_type.__name__}, "
+                f"found {'none' if not entities else 'more'}",
+            )
+
+        return entities[0]
+
+    def all(self) -> t.List["Entity"]:
+        return list(self)
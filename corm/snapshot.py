@@ -0,0 +1,587 @@
+"""Binary snapshot of storage
+
+File consists of header, table of sections and sections themselves::
+
+    header    magic, format version, number of sections
+    sections  name, offset and length of every section
+    meta      pickled types, relation kinds, pending relations, lazy fields
+    types     type index of every entity
+    refs      whether pickled data of entity refers to other entities
+    offsets   offset of pickled data of every entity in payload, plus end
+    payload   pickled data of entities one after another
+    edgeidx   offset of first relation of every entity in edges, plus end
+    edges     relation kind index and related entity index of every relation
+    pkhash    hashes of primary keys, sorted within every pk field
+    pkids     entity index for every hash in pkhash
+
+Numbers are little endian arrays, so they are used straight from memory
+mapped file. Entities inside data of other entities and relations refer to
+entities by their position, so every entity can be decoded on its own.
+"""
+
+import array
+import bisect
+import gc
+import io
+import itertools
+import mmap
+import numbers
+import os
+import pickle
+import struct
+import sys
+import typing as t
+import zlib
+
+from corm import registry
+from corm.entity import Entity
+from corm.fields import NestedList, RelationshipList
+from corm.storage import EntityRef
+
+if t.TYPE_CHECKING:
+    from corm.fields import Field
+    from corm.storage import Storage
+
+MAGIC = b"CORM"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHH")
+SECTION = struct.Struct("<8sQQ")
+# typecodes of arrays for sections with numbers
+FLAG = "B"
+INDEX = "I"
+OFFSET = "Q"
+
+
+def get_type_name(entity_type: type) -> str:
+    return f"{entity_type.__module__}.{entity_type.__name__}"
+
+
+def get_field_ref(field: "Field") -> t.Tuple[str, str]:
+    return get_type_name(field.owner), field.name
+
+
+def get_field(ref: t.Tuple[str, str]) -> "Field":
+    type_name, name = ref
+
+    return registry.get(type_name).__fields__[name]
+
+
+def get_key_hash(key: t.Any) -> int:
+    # builtin hash of strings differs between processes, keys are hashed
+    # when snapshot is written and looked up in other processes
+    if isinstance(key, str):
+        value = zlib.crc32(key.encode("utf-8", "surrogatepass"))
+    elif isinstance(key, bytes):
+        value = zlib.crc32(key)
+    elif isinstance(key, tuple):
+        value = zlib.crc32(
+            b"".join(struct.pack("<Q", get_key_hash(item)) for item in key)
+        )
+    elif key is None or isinstance(key, numbers.Number):
+        value = hash(key)
+    else:
+        value = zlib.crc32(repr(key).encode("utf-8", "surrogatepass"))
+
+    return value & 0xFFFFFFFFFFFFFFFF
+
+
+def _to_bytes(items: array.array) -> bytes:
+    if sys.byteorder != "little":
+        items.byteswap()
+
+    return items.tobytes()
+
+
+def _from_bytes(typecode: str, data: memoryview) -> t.Sequence[int]:
+    if sys.byteorder == "little":
+        return data.cast(typecode)
+
+    items = array.array(typecode, data)
+    items.byteswap()
+
+    return items
+
+
+class _HasReferences(Exception):
+    pass
+
+
+class _Pickler(pickle.Pickler):
+    # reducer_override isn't called for builtin types, so data without
+    # entities is pickled at full speed
+    def reducer_override(self, obj: t.Any) -> t.Any:
+        if isinstance(obj, (Entity, NestedList)):
+            raise _HasReferences
+
+        return NotImplemented
+
+
+class _ReferencePickler(pickle.Pickler):
+    # entities are written as their positions, nested lists as position of
+    # owner, index of relation type and positions of items
+    def __init__(
+        self,
+        file: t.BinaryIO,
+        ids: t.Dict["Entity", int],
+        entity_types: t.Iterable[t.Type["Entity"]],
+        relation_types: t.Dict[t.Any, int],
+    ):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.ids = ids
+        self.relation_types = relation_types
+        # persistent_id is called for every object, lookup by exact type is
+        # much cheaper than isinstance checks
+        self.kinds = dict.fromkeys(entity_types, False)
+        self.kinds[NestedList] = True
+
+    def get_id(self, entity: "Entity") -> int:
+        try:
+            return self.ids[entity]
+        except KeyError:
+            raise ValueError(f"{entity} is not in storage") from None
+
+    def persistent_id(self, obj: t.Any) -> t.Any:
+        is_list = self.kinds.get(obj.__class__)
+
+        if is_list is None:
+            return None
+
+        if not is_list:
+            return self.get_id(obj)
+
+        relation_type = self.relation_types.setdefault(
+            obj.relation_type,
+            len(self.relation_types),
+        )
+
+        return (
+            self.get_id(obj.entity),
+            relation_type,
+            [self.get_id(entity) for entity in obj],
+        )
+
+    def reducer_override(self, obj: t.Any) -> t.Any:
+        # entities of types which aren't tracked by storage
+        if isinstance(obj, Entity):
+            raise ValueError(f"{obj} is not in storage")
+
+        return NotImplemented
+
+
+def make_persistent_load(
+    get_entity: t.Callable[[int], "Entity"],
+    relation_types: t.Sequence[t.Any],
+) -> t.Callable[[t.Any], t.Any]:
+    def persistent_load(pid):
+        if isinstance(pid, int):
+            return get_entity(pid)
+
+        owner_id, relation_type, ids = pid
+        items = NestedList.__new__(NestedList)
+        # relations are restored separately, so they aren't made again
+        RelationshipList.__init__(
+            items,
+            entity=get_entity(owner_id),
+            items=[get_entity(entity_id) for entity_id in ids],
+            relation_type=relation_types[relation_type],
+        )
+
+        return items
+
+    return persistent_load
+
+
+def decode(
+    payload: t.Union[bytes, memoryview],
+    has_references: bool,
+    persistent_load: t.Callable[[t.Any], t.Any],
+) -> t.Any:
+    if not has_references:
+        return pickle.loads(payload)
+
+    unpickler = pickle.Unpickler(io.BytesIO(payload))
+    unpickler.persistent_load = persistent_load
+
+    return unpickler.load()
+
+
+def write(storage: "Storage", file: t.BinaryIO) -> t.Dict["Entity", int]:
+    """Write snapshot, returns positions of entities in it"""
+    entities = []
+    types = array.array(INDEX)
+    type_names = []
+
+    for type_id, (entity_type, type_entities) in enumerate(
+        storage._get_types().items()
+    ):
+        type_entities = list(type_entities)
+        entities.extend(type_entities)
+        types.extend(itertools.repeat(type_id, len(type_entities)))
+        type_names.append(get_type_name(entity_type))
+
+    ids = {entity: i for i, entity in enumerate(entities)}
+    edge_key_ids = {}
+
+    def get_edge_key_id(bucket_key):
+        edge_key_id = edge_key_ids.get(bucket_key)
+
+        if edge_key_id is None:
+            edge_key_id = edge_key_ids[bucket_key] = len(edge_key_ids)
+
+        return edge_key_id
+
+    relation_types = {}
+    payload = io.BytesIO()
+    refs = array.array(FLAG)
+    offsets = array.array(OFFSET, [0])
+    edge_index = array.array(OFFSET, [0])
+    edges = array.array(INDEX)
+    pickler = _Pickler(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    reference_pickler = _ReferencePickler(
+        payload,
+        ids,
+        storage._types,
+        relation_types,
+    )
+    get_relations = storage._relations.get
+    # entities of types which had references are likely to have them too,
+    # they aren't tried to be pickled without references first
+    referencing_types = set()
+
+    for entity in entities:
+        offset = offsets[-1]
+        has_references = type(entity) in referencing_types
+        data = entity._data
+
+        # columns of columnar entities are saved as ordinary values
+        if type(data) is not dict:
+            data = dict(data)
+
+        if not has_references:
+            try:
+                pickler.dump(data)
+            except _HasReferences:
+                payload.seek(offset)
+                payload.truncate()
+                referencing_types.add(type(entity))
+                has_references = True
+            finally:
+                # objects are shared between entities only through entities
+                pickler.clear_memo()
+
+        if has_references:
+            reference_pickler.dump(data)
+            reference_pickler.clear_memo()
+
+        refs.append(has_references)
+        offsets.append(payload.tell())
+        relations = get_relations(entity)
+
+        if relations:
+            for bucket_key, bucket in relations.items():
+                edge_key_id = get_edge_key_id(bucket_key)
+
+                try:
+                    for related_entity in bucket:
+                        edges.append(edge_key_id)
+                        edges.append(ids[related_entity])
+                except KeyError:
+                    raise ValueError(f"{related_entity} is not in storage") from None
+
+        edge_index.append(len(edges) // 2)
+
+    pending = [
+        (
+            get_field_ref(field),
+            key,
+            [
+                (get_edge_key_id(bucket_key), [ids[entity] for entity in bucket])
+                for bucket_key, bucket in relations.items()
+            ],
+        )
+        for field, nodes in storage._pending.items()
+        for key, relations in nodes.items()
+    ]
+    deferred = [
+        (ids[entity], [get_field_ref(field) for field in fields])
+        for entity, fields in storage._deferred.items()
+    ]
+    pk_keys = {}
+
+    for field, keys in storage._entities.items():
+        if keys:
+            pk_keys[field] = [
+                (get_key_hash(key), ids[entity]) for key, entity in keys.items()
+            ]
+
+    pk_fields = []
+    pk_hashes = array.array(OFFSET)
+    pk_ids = array.array(INDEX)
+
+    for field, keys in pk_keys.items():
+        keys.sort()
+        pk_fields.append((get_field_ref(field), len(pk_hashes), len(keys)))
+        pk_hashes.extend(key_hash for key_hash, _ in keys)
+        pk_ids.extend(entity_id for _, entity_id in keys)
+    meta = {
+        "types": type_names,
+        "edge_keys": [
+            (get_type_name(related_type), relation_type)
+            for related_type, relation_type in edge_key_ids
+        ],
+        "relation_types": list(relation_types),
+        "pending": pending,
+        "deferred": deferred,
+        "pk_fields": pk_fields,
+    }
+    sections = [
+        (b"meta", pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL)),
+        (b"types", _to_bytes(types)),
+        (b"refs", _to_bytes(refs)),
+        (b"offsets", _to_bytes(offsets)),
+        (b"payload", payload.getbuffer()),
+        (b"edgeidx", _to_bytes(edge_index)),
+        (b"edges", _to_bytes(edges)),
+        (b"pkhash", _to_bytes(pk_hashes)),
+        (b"pkids", _to_bytes(pk_ids)),
+    ]
+    offset = HEADER.size + SECTION.size * len(sections)
+
+    file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+
+    for name, data in sections:
+        file.write(SECTION.pack(name, offset, len(data)))
+        offset += len(data)
+
+    for _, data in sections:
+        file.write(data)
+
+    return ids
+
+
+class Reader:
+    def __init__(self, buffer: t.Union[bytes, memoryview, mmap.mmap]):
+        self.buffer = memoryview(buffer)
+
+        magic, version, count = HEADER.unpack_from(self.buffer)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a storage snapshot or unsupported version")
+
+        self.sections = {}
+
+        for i in range(count):
+            name, offset, length = SECTION.unpack_from(
+                self.buffer,
+                HEADER.size + SECTION.size * i,
+            )
+            self.sections[name.rstrip(b"\0")] = self.buffer[offset : offset + length]
+
+        meta = pickle.loads(self.sections[b"meta"])
+
+        self.type_names = meta["types"]
+        self.types = [registry.get(name) for name in self.type_names]
+        self.edge_keys = [
+            (registry.get(type_name), relation_type)
+            for type_name, relation_type in meta["edge_keys"]
+        ]
+        self.relation_types = meta["relation_types"]
+        self.pending = meta["pending"]
+        self.deferred = meta["deferred"]
+        self.pk_fields = {
+            get_field(field_ref): (start, count)
+            for field_ref, start, count in meta["pk_fields"]
+        }
+        self.type_ids = _from_bytes(INDEX, self.sections[b"types"])
+        self.refs = _from_bytes(FLAG, self.sections[b"refs"])
+        self.offsets = _from_bytes(OFFSET, self.sections[b"offsets"])
+        self.edge_index = _from_bytes(OFFSET, self.sections[b"edgeidx"])
+        self.edges = _from_bytes(INDEX, self.sections[b"edges"])
+        self.pk_hashes = _from_bytes(OFFSET, self.sections[b"pkhash"])
+        self.pk_ids = _from_bytes(INDEX, self.sections[b"pkids"])
+        self.count = len(self.type_ids)
+
+    def close(self):
+        # memory mapped file can't be closed while there are views of it
+        for items in (
+            self.type_ids,
+            self.refs,
+            self.offsets,
+            self.edge_index,
+            self.edges,
+            self.pk_hashes,
+            self.pk_ids,
+        ):
+            if isinstance(items, memoryview):
+                items.release()
+
+        for section in self.sections.values():
+            section.release()
+
+        self.buffer.release()
+
+    def get_type(self, entity_id: int) -> t.Type["Entity"]:
+        return self.types[self.type_ids[entity_id]]
+
+    def get_payload(self, entity_id: int) -> memoryview:
+        return self.sections[b"payload"][
+            self.offsets[entity_id] : self.offsets[entity_id + 1]
+        ]
+
+    def find_key(self, field: "Field", key: t.Any) -> t.Iterator[int]:
+        """Indexes of entities which key has the same hash as given one"""
+        if field not in self.pk_fields:
+            return
+
+        start, count = self.pk_fields[field]
+        key_hash = get_key_hash(key)
+        i = bisect.bisect_left(self.pk_hashes, key_hash, start, start + count)
+
+        while i < start + count and self.pk_hashes[i] == key_hash:
+            yield self.pk_ids[i]
+            i += 1
+
+    def iter_edges(self, entity_id: int) -> t.Iterator[t.Tuple[int, int]]:
+        """Relation kind indexes and related entity indexes of entity"""
+        start = self.edge_index[entity_id] * 2
+        end = self.edge_index[entity_id + 1] * 2
+        edges = self.edges[start:end]
+
+        for i in range(0, end - start, 2):
+            yield edges[i], edges[i + 1]
+
+
+def read(reader: Reader, storage: "Storage") -> t.List["Entity"]:
+    # lots of objects are created at once and none of them is garbage,
+    # collector would scan them over and over again
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        return _read(reader, storage)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read(reader: Reader, storage: "Storage") -> t.List["Entity"]:
+    types = reader.types
+    entities = [types[type_id].__new__(types[type_id]) for type_id in reader.type_ids]
+    payload = reader.sections[b"payload"]
+    # whole arrays are read anyway, lists are faster to index
+    offsets = reader.offsets.tolist()
+    persistent_load = make_persistent_load(
+        entities.__getitem__,
+        reader.relation_types,
+    )
+
+    for entity_id, (entity, has_references) in enumerate(zip(entities, reader.refs)):
+        entity.storage = storage
+        entity._data = decode(
+            payload[offsets[entity_id] : offsets[entity_id + 1]],
+            has_references,
+            persistent_load,
+        )
+
+    if any(entity_type.__columns__ for entity_type in types):
+        for entity in entities:
+            if entity.__columns__:
+                entity._data = storage._get_table(type(entity)).add(
+                    entity,
+                    entity._data,
+                )
+
+    storage.add_many(entities)
+
+    indexed = {entity_type for entity_type in types if entity_type.__index_fields__}
+    # references are kept by storage only, they are made again from data
+    referencing = {
+        entity_type
+        for entity_type in types
+        if any(
+            getattr(field, "reverse_index", False)
+            for field in entity_type.__fields__.values()
+        )
+    }
+
+    # storage can have own entities, they are indexed already
+    if indexed or referencing:
+        for entity in entities:
+            if type(entity) in indexed:
+                storage.index(entity)
+
+            if type(entity) in referencing:
+                storage._add_references(entity)
+
+    relations = storage._relations
+    entity_set = storage._entity_set
+    edge_keys = reader.edge_keys
+    edge_index = reader.edge_index.tolist()
+    edges = reader.edges.tolist()
+
+    for entity_id, entity in enumerate(entities):
+        start = edge_index[entity_id] * 2
+        end = edge_index[entity_id + 1] * 2
+
+        if start == end:
+            continue
+
+        entity_relations = relations[entity] = {}
+
+        for i in range(start, end, 2):
+            bucket_key = edge_keys[edges[i]]
+            bucket = entity_relations.get(bucket_key)
+
+            if bucket is None:
+                bucket = entity_relations[bucket_key] = entity_set()
+
+            bucket[entities[edges[i + 1]]] = None
+
+    # storage can have own entities and relations made by the same keys
+    for field_ref, key, buckets in reader.pending:
+        field = get_field(field_ref)
+        entity = storage._entities.get(field, {}).get(key)
+        storage._merge_relations(
+            EntityRef(field, key) if entity is None else entity,
+            {
+                edge_keys[edge_key_id]: entity_set(
+                    (entities[related_id], None) for related_id in related_ids
+                )
+                for edge_key_id, related_ids in buckets
+            },
+        )
+
+    for entity_id, field_refs in reader.deferred:
+        for field_ref in field_refs:
+            storage.defer(entities[entity_id], get_field(field_ref))
+
+    return entities
+
+
+def dump(storage: "Storage", path: t.Union[str, os.PathLike]):
+    with open(path, "wb") as file:
+        write(storage, file)
+
+
+def load(storage: "Storage", path: t.Union[str, os.PathLike]) -> t.List["Entity"]:
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            reader = Reader(buffer)
+
+            try:
+                return read(reader, storage)
+            finally:
+                reader.close()
+
+
+def dumps(storage: "Storage") -> bytes:
+    file = io.BytesIO()
+    write(storage, file)
+
+    return file.getvalue()
+
+
+def loads(storage: "Storage", data: bytes) -> t.List["Entity"]:
+    return read(Reader(data), storage)
@@ -0,0 +1,140 @@
+import contextlib
+import enum
+import functools
+import time
+import typing as t
+
+if t.TYPE_CHECKING:
+    from corm.storage import Storage
+
+
+def _get_type_name(entity_type: type) -> str:
+    return f"{entity_type.__module__}.{entity_type.__name__}"
+
+
+def _get_relation_name(relation_type: t.Any) -> str:
+    if isinstance(relation_type, enum.Enum):
+        return relation_type.name
+
+    return str(relation_type)
+
+
+class Stats:
+    """Statistics of storage created with `stats=True`
+
+    Counters and timers are updated by wrappers of storage methods which
+    are set on storage only when statistics are enabled, sizes of storage
+    are computed from its state by `as_dict`.
+    """
+
+    def __init__(self, storage: "Storage"):
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+        # seconds spent in loading and dumping of entities and in making and
+        # removing relations, relations made while entities are loaded are
+        # counted in both
+        self.time = {"load": 0.0, "dump": 0.0, "relations": 0.0}
+        self._measured = dict.fromkeys(self.time, False)
+
+        storage.get = self._count_hits(storage.get)
+        storage.load_many = self._timed("load", storage.load_many)
+
+        for name in ("dump", "dumps"):
+            setattr(storage, name, self._timed("dump", getattr(storage, name)))
+
+        for name in (
+            "make_key_relation",
+            "make_relation",
+            "remove_relation",
+            "remove_relations",
+            "_merge_relations",
+        ):
+            setattr(storage, name, self._timed("relations", getattr(storage, name)))
+
+    def measuring(self, kind: str) -> bool:
+        return self._measured[kind]
+
+    def start(self, kind: str) -> t.Optional[float]:
+        # calls made inside of measured one (e.g. nested entities) are
+        # already counted, they get no start time
+        if self._measured[kind]:
+            return None
+
+        self._measured[kind] = True
+
+        return time.perf_counter()
+
+    def stop(self, kind: str, start: t.Optional[float]):
+        if start is not None:
+            self.time[kind] += time.perf_counter() - start
+            self._measured[kind] = False
+
+    @contextlib.contextmanager
+    def measure(self, kind: str) -> t.Iterator[None]:
+        start = self.start(kind)
+
+        try:
+            yield
+        finally:
+            self.stop(kind, start)
+
+    def _timed(self, kind: str, method: t.Callable) -> t.Callable:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.measure(kind):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    def _count_hits(self, get: t.Callable) -> t.Callable:
+        @functools.wraps(get)
+        def wrapper(field, entity_key):
+            entity = get(field, entity_key)
+
+            if entity is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return entity
+
+        return wrapper
+
+    def reset(self):
+        self.hits = self.misses = 0
+        self.time = dict.fromkeys(self.time, 0.0)
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        storage = self.storage
+        relations = {}
+
+        for node_relations in list(storage._relations.values()):
+            for (entity_type, relation_type), related in node_relations.items():
+                if related:
+                    counts = relations.setdefault(_get_type_name(entity_type), {})
+                    name = _get_relation_name(relation_type)
+                    counts[name] = counts.get(name, 0) + len(related)
+
+        lookups = self.hits + self.misses
+
+        return {
+            "entities": {
+                _get_type_name(entity_type): len(entities)
+                for entity_type, entities in list(storage._get_types().items())
+                if entities
+            },
+            "keys": {
+                f"{_get_type_name(field.owner)}.{field.name}": len(keys)
+                for field, keys in list(storage._entities.items())
+                if keys
+            },
+            "relations": relations,
+            "pending": len(storage.unresolved()),
+            "get": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            },
+            "time": dict(self.time),
+        }
@@ -1,39 +1,628 @@
+import asyncio
 import collections
-import functools
+import inspect
+import json
+import os
 import typing as t
+import weakref
 
-from collections import defaultdict
+from corm.constants import AccessMode, IndexType
+from corm.index import HashIndex, SortedIndex, WeakBucket, make_weak_bucket
+from corm.query import Query
 
 if t.TYPE_CHECKING:
-    from corm.entity import Entity, Field
+    import numpy as np
+
+    from corm.batch import Batch
+    from corm.columnar import ColumnTable
+    from corm.entity import Entity
+    from corm.fields import Field, KeyNested, Nested
+    from corm.stats import Stats
 
 EntityRef = collections.namedtuple("EntityRef", ["field", "key"])
+LoadResult = collections.namedtuple("LoadResult", ["count", "unresolved"])
 
 
 class Storage:
-    def __init__(self):
-        self._entities: t.Dict[t.Tuple["Field", t.Any], "Entity"] = {}
-        self._relations = defaultdict(functools.partial(defaultdict, list))
+    stats: t.Optional["Stats"] = None
+
+    def __init__(self, weak: bool = False, stats: bool = False):
+        # in weak mode storage doesn't keep entities alive, entities which are
+        # not referenced anywhere else disappear from storage with all
+        # their relations
+        self.weak = weak
+        # changed every time set of entities available by keys is changed
+        self.version = 0
+        # every mapping with entities as keys is created by this factory
+        self._entity_set = weakref.WeakKeyDictionary if weak else dict
+        self._key_map = weakref.WeakValueDictionary if weak else dict
+        # pk field -> key -> entity
+        self._entities: t.Dict["Field", t.Dict[t.Any, "Entity"]] = {}
+        self._types: t.Dict[t.Type["Entity"], t.Dict["Entity", None]] = {}
+        # tracked entities added since registry was read, they are sorted by
+        # type on next read to keep adding cheap, see `_get_types`
+        self._added: t.List["Entity"] = []
+        self._indexes: t.Dict["Field", t.Union[HashIndex, SortedIndex]] = {}
+        # entity -> lazy nested fields which are not loaded yet
+        self._deferred: t.Dict["Entity", t.Dict["Nested", None]] = self._entity_set()
+        # entity -> (related entity type, relation type) -> related entities,
+        # dicts are used as insertion ordered sets
+        self._relations: t.Dict[
+            "Entity",
+            t.Dict[t.Tuple[t.Type["Entity"], t.Any], t.Dict["Entity", None]],
+        ] = self._entity_set()
+        # relations made by key of entity which isn't in storage yet:
+        # pk field -> key -> same as relations of entity, they are moved to
+        # entity as soon as it is added
+        self._pending: t.Dict[
+            "Field",
+            t.Dict[
+                t.Any,
+                t.Dict[t.Tuple[t.Type["Entity"], t.Any], t.Dict["Entity", None]],
+            ],
+        ] = {}
+        # KeyNested field with reverse index -> key -> entities referencing
+        # entity with that key by the field
+        self._references: t.Dict[
+            "KeyNested",
+            t.Dict[t.Any, t.Dict["Entity", None]],
+        ] = {}
+        # values of numeric fields of columnar entities by entity type
+        self._columns: t.Dict[t.Type["Entity"], "ColumnTable"] = {}
+        # values and entities extracted for batch evaluation with state of
+        # storage they were extracted for, values are dropped when field is
+        # set: field -> entity type -> (state, values, groups of values)
+        self._column_cache: t.Dict[
+            "Field",
+            t.Dict[t.Type["Entity"], t.Tuple[t.Tuple, "np.ndarray", t.Any]],
+        ] = {}
+        self._entity_cache: t.Dict[
+            t.Type["Entity"],
+            t.Tuple[t.Tuple, t.List["Entity"]],
+        ] = {}
+
+        if stats:
+            from corm.stats import Stats
+
+            # methods are wrapped only when statistics are enabled, so there
+            # is no cost otherwise
+            self.stats = Stats(self)
+
+    def _get_node_relations(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        create: bool = False,
+    ) -> t.Optional[t.Dict]:
+        if isinstance(entity, EntityRef):
+            nodes = self._pending.get(entity.field)
+
+            if nodes is None:
+                if not create:
+                    return None
+
+                nodes = self._pending[entity.field] = {}
+
+            node = entity.key
+        else:
+            nodes = self._relations
+            node = entity
+
+        relations = nodes.get(node)
+
+        if relations is None and create:
+            relations = nodes[node] = {}
+
+        return relations
+
+    def _get_keys(self, field: "Field") -> t.Dict[t.Any, "Entity"]:
+        keys = self._entities.get(field)
+
+        if keys is None:
+            keys = self._entities[field] = self._key_map()
+
+        return keys
 
     def add(self, entity: "Entity"):
         if entity.__pk_fields__:
             for field in entity.__pk_fields__:
                 value = getattr(entity, field.name)
-                key = EntityRef(field, value)
+                keys = self._get_keys(field)
 
-                if key in self._entities:
+                if value in keys:
                     raise ValueError(f"{field}={value} already in storage")
 
-                # resolve reference relations
-                relations = self._relations.pop(key, None)
+                keys[value] = entity
+
+                if field in self._pending:
+                    self._resolve_ref(field, value, entity)
+
+            self.version += 1
+
+        if entity.__tracked__:
+            self._add_type(entity)
+
+    def _add_type(self, entity: "Entity"):
+        # weak storage can't hold entities even for a while
+        if self.weak:
+            entities = self._types.get(type(entity))
+
+            if entities is None:
+                entities = self._types[type(entity)] = self._entity_set()
+
+            entities[entity] = None
+        else:
+            self._added.append(entity)
+
+    def _get_types(self) -> t.Dict[t.Type["Entity"], t.Dict["Entity", None]]:
+        added = self._added
+
+        if added:
+            self._added = []
+
+            for entity in added:
+                entities = self._types.get(type(entity))
+
+                if entities is None:
+                    entities = self._types[type(entity)] = self._entity_set()
+
+                entities[entity] = None
+
+        return self._types
+
+    def _check_keys(
+        self,
+        entities: t.Iterable["Entity"],
+    ) -> t.Dict["Field", t.Dict[t.Any, "Entity"]]:
+        # primary keys of entities if they are taken neither in storage nor
+        # by each other
+        keys = {}
+
+        for entity in entities:
+            for field in entity.__pk_fields__ or ():
+                value = getattr(entity, field.name)
+                field_keys = keys.get(field)
+
+                if field_keys is None:
+                    field_keys = keys[field] = {}
+
+                if value in field_keys or value in self._entities.get(field, ()):
+                    raise ValueError(f"{field}={value} already in storage")
+
+                field_keys[value] = entity
+
+        return keys
+
+    def add_many(self, entities: t.Iterable["Entity"]):
+        entities = list(entities)
+        self._add_checked(entities, self._check_keys(entities))
+
+    def _add_checked(
+        self,
+        entities: t.List["Entity"],
+        keys: t.Dict["Field", t.Dict[t.Any, "Entity"]],
+    ):
+        for field, field_keys in keys.items():
+            self._get_keys(field).update(field_keys)
+
+        if keys:
+            self.version += 1
+
+        if self._pending:
+            self._resolve_refs(keys)
+
+        for entity in entities:
+            if entity.__tracked__:
+                self._add_type(entity)
+
+    def remove(self, entity: "Entity"):
+        """Remove entity from storage
+
+        Entity isn't available by keys and in queries anymore and its own
+        relations are dropped. Relations of other entities to it stay as is.
+        """
+        self._remove_keys(entity)
+
+        for field in entity.__index_fields__:
+            index = self._indexes.get(field)
+
+            if index is not None:
+                index.remove(entity, getattr(entity, field.name))
+
+        entities = self._get_types().get(type(entity))
+
+        if entities is not None:
+            entities.pop(entity, None)
+
+        self._remove_node(entity)
+        self._remove_references(entity)
+
+        # removed entity keeps its data, but not in columns of storage
+        if entity.__columns__ and type(entity._data) is not dict:
+            entity._data = entity._data.detach()
+
+        self._increment_version()
+
+    def _remove_keys(self, entity: "Entity"):
+        for field in entity.__pk_fields__ or ():
+            keys = self._entities.get(field)
+            value = getattr(entity, field.name)
+
+            if keys is not None and keys.get(value) is entity:
+                del keys[value]
+
+    def _remove_node(self, entity: "Entity"):
+        self._deferred.pop(entity, None)
+        self._relations.pop(entity, None)
+
+    def _increment_version(self):
+        self.version += 1
+
+    def add_reference(self, field: "KeyNested", key: t.Any, entity: "Entity"):
+        keys = self._references.get(field)
+
+        if keys is None:
+            keys = self._references[field] = {}
+
+        entities = keys.get(key)
+
+        if entities is None:
+            entities = keys[key] = (
+                make_weak_bucket(keys, key) if self.weak else self._entity_set()
+            )
+
+        entities[entity] = None
+
+    def remove_reference(self, field: "KeyNested", key: t.Any, entity: "Entity"):
+        keys = self._references.get(field)
+        entities = keys and keys.get(key)
+
+        if entities is not None:
+            entities.pop(entity, None)
+
+            if not entities:
+                del keys[key]
+
+    def _add_references(self, entity: "Entity"):
+        for field in entity.__fields__.values():
+            if getattr(field, "reverse_index", False):
+                for key in field.get_keys(entity._data.get(field.origin)):
+                    self.add_reference(field, key, entity)
+
+    def _remove_references(self, entity: "Entity"):
+        # fields can be added by other threads of ConcurrentStorage
+        for field in list(self._references):
+            if isinstance(entity, field.owner):
+                for key in field.get_keys(entity._data.get(field.origin)):
+                    self.remove_reference(field, key, entity)
+
+    def get_referencing(
+        self,
+        field: "KeyNested",
+        target: t.Union["Entity", t.Any],
+    ) -> t.List["Entity"]:
+        """Entities referencing target entity or key by KeyNested field
+
+        Field should be created with `reverse_index=True`.
+        """
+        if not getattr(field, "reverse_index", False):
+            raise ValueError(f"{field} has no reverse index")
+
+        related_field = field.related_entity_field
+
+        if isinstance(target, related_field.owner):
+            target = getattr(target, related_field.name)
+
+        keys = self._references.get(field)
+
+        return list(keys.get(target, ())) if keys else []
+
+    def _get_table(self, entity_type: t.Type["Entity"]) -> "ColumnTable":
+        table = self._columns.get(entity_type)
+
+        if table is None:
+            from corm.columnar import ColumnTable
+
+            table = self._columns[entity_type] = ColumnTable(
+                entity_type.__columns__,
+                weak=self.weak,
+            )
+
+        return table
+
+    def column(self, field: "Field") -> "np.ndarray":
+        """Values of numeric field of all columnar entities as numpy array
+
+        Order of values is the same as order of `column_entities` of field
+        owner. Array is read only, values are changed through fields.
+        """
+        if field.origin not in field.owner.__columns__:
+            raise ValueError(f"{field} is not column field")
+
+        tables = [
+            table
+            for entity_type, table in self._columns.items()
+            if issubclass(entity_type, field.owner) and table.size
+        ]
+
+        if len(tables) == 1:
+            return tables[0].column(field.origin)
+
+        import numpy as np
+
+        return np.concatenate(
+            [table.column(field.origin) for table in tables]
+            or [np.empty(0, field.owner.__columns__[field.origin])],
+        )
+
+    def _check_tracked(self, entity_type: t.Type["Entity"]):
+        if not entity_type.__tracked__:
+            raise ValueError(
+                f"Entities of {entity_type.__name__} aren't tracked by storage",
+            )
+
+    def batch(self, entity_type: t.Type["Entity"]) -> "Batch":
+        """Evaluate filters and aggregates over all entities of type with numpy"""
+        from corm.batch import Batch
+
+        self._check_tracked(entity_type)
+
+        return Batch(storage=self, entity_type=entity_type)
+
+    def column_entities(self, entity_type: t.Type["Entity"]) -> t.List["Entity"]:
+        """Columnar entities in order of values of `column`"""
+        return [
+            entity
+            for type_, table in self._columns.items()
+            if issubclass(type_, entity_type)
+            for entity in table.entities()
+        ]
+
+    def index(self, entity: "Entity"):
+        for field in entity.__index_fields__:
+            index = self._indexes.get(field)
+
+            if index is None:
+                index = self._indexes[field] = self._make_index(field)
+
+            index.add(entity, getattr(entity, field.name))
+
+    def _make_index(self, field: "Field") -> t.Union[HashIndex, SortedIndex]:
+        if field.index == IndexType.SORTED:
+            return SortedIndex(field, weak=self.weak)
+
+        return HashIndex(field, weak=self.weak)
+
+    def update_index(
+        self,
+        entity: "Entity",
+        field: "Field",
+        old_value: t.Any,
+        value: t.Any,
+    ):
+        if old_value == value:
+            return
+
+        if field.pk:
+            keys = self._get_keys(field)
+
+            # removed entity keeps its storage, but changing it doesn't bring
+            # it back
+            if keys.get(old_value) is not entity:
+                return
+
+            if value in keys:
+                raise ValueError(f"{field}={value} already in storage")
+
+            del keys[old_value]
+            keys[value] = entity
+
+            if field in self._pending:
+                self._resolve_ref(field, value, entity)
+
+            self.version += 1
+        elif not self._contains(entity, field, old_value):
+            return
+
+        index = self._indexes.get(field)
+
+        if index is not None:
+            index.remove(entity, old_value)
+            index.add(entity, value)
+
+    def _contains(self, entity: "Entity", field: "Field", value: t.Any) -> bool:
+        # whether entity is in storage, `value` is current value of its
+        # indexed field
+        if entity.__pk_fields__:
+            pk_field = entity.__pk_fields__[0]
+            keys = self._entities.get(pk_field, {})
+
+            return keys.get(getattr(entity, pk_field.name)) is entity
+
+        if entity.__tracked__:
+            return entity in self._get_types().get(type(entity), ())
+
+        # untracked entities without primary key are only in indexes
+        index = self._indexes.get(field)
+
+        return index is not None and any(item is entity for item in index.get(value))
+
+    def get_index(
+        self,
+        field: "Field",
+    ) -> t.Optional[t.Union[HashIndex, SortedIndex]]:
+        return self._indexes.get(field)
+
+    def get_entities(self, entity_type: t.Type["Entity"]) -> t.Iterator["Entity"]:
+        for type_, entities in self._get_types().items():
+            if issubclass(type_, entity_type):
+                yield from entities
+
+    def _resolve_ref(self, field: "Field", value: t.Any, entity: "Entity"):
+        # move relations made by key before entity appeared in storage
+        pending = self._pending[field]
+        relations = pending.pop(value, None)
+
+        if not pending:
+            del self._pending[field]
+
+        if relations:
+            self._merge_relations(entity, relations)
+
+    def _merge_relations(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        relations: t.Dict,
+    ):
+        entity_relations = self._get_node_relations(entity, create=True)
+
+        if not entity_relations:
+            entity_relations.update(relations)
+        else:
+            for bucket_key, related_entities in relations.items():
+                bucket = entity_relations.get(bucket_key)
+
+                if bucket is None:
+                    entity_relations[bucket_key] = related_entities
+                else:
+                    bucket.update(related_entities)
+
+    def _resolve_refs(self, keys: t.Mapping["Field", t.Mapping[t.Any, "Entity"]]):
+        for field, field_keys in keys.items():
+            for value, entity in field_keys.items():
+                # pending relations of field can run out before keys
+                if field not in self._pending:
+                    break
+
+                self._resolve_ref(field, value, entity)
+
+    def unresolved(self) -> t.List[EntityRef]:
+        """Keys which relations were made by, but entities aren't in storage"""
+        return [
+            EntityRef(field, key)
+            for field, nodes in list(self._pending.items())
+            for key, relations in list(nodes.items())
+            if any(relations.values())
+        ]
+
+    def _get_bucket(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        bucket_key: t.Tuple[t.Type["Entity"], t.Any],
+    ) -> t.Optional[t.Dict["Entity", None]]:
+        relations = self._get_node_relations(entity)
+
+        if relations is not None:
+            return relations.get(bucket_key)
+
+    def load_many(
+        self,
+        entity_type: t.Type["Entity"],
+        items: t.Iterable[t.Any],
+    ) -> t.List["Entity"]:
+        """Load batch of entities of same type
+
+        Unlike creating entities one by one, primary keys are added in bulk
+        after all entities are loaded and relations made by keys of entities
+        from the batch are resolved once at the end. Keys are checked before
+        anything is loaded, if any of them is taken nothing is added.
+        """
+        new = entity_type.__new__
+        load = entity_type.__load__
+        entities = []
+        append = entities.append
+        # defaults of key fields are filled before check, loader keeps them
+        key_defaults = [
+            (field.origin, field.default)
+            for pk_field in entity_type.__pk_fields__ or ()
+            for field in getattr(pk_field, "fields", None) or (pk_field,)
+            if field.default is not ... and field.mode & AccessMode.LOAD
+        ]
+
+        for data in items:
+            entity = new(entity_type)
+            entity._data = data
+            entity.storage = self
+
+            for origin, default in key_defaults:
+                if origin not in data:
+                    data[origin] = default()
+
+            append(entity)
+
+        keys = self._check_keys(entities) if entity_type.__pk_fields__ else {}
+        version = self.version
+
+        for entity in entities:
+            load(entity, entity._data)
+
+        # nested entities could take keys while batch was loaded
+        if self.version == version:
+            self._add_checked(entities, keys)
+        else:
+            self.add_many(entities)
+
+        if entity_type.__index_fields__:
+            for entity in entities:
+                self.index(entity)
+
+        return entities
+
+    async def aload_stream(
+        self,
+        entity_type: t.Type["Entity"],
+        items: t.AsyncIterable[t.Any],
+        batch_size: int = 1000,
+        progress: t.Optional[t.Callable[[int], t.Any]] = None,
+    ) -> LoadResult:
+        """Load entities from async stream by batches
+
+        Items can be data of entities or JSON lines as str or bytes. Control
+        goes back to event loop after every batch, `progress` is called (or
+        awaited) with number of entities loaded so far.
+        """
+        count = 0
+        batch = []
+
+        async def flush():
+            nonlocal count
+
+            self.load_many(entity_type, batch)
+            count += len(batch)
+            batch.clear()
+
+            if progress is not None:
+                result = progress(count)
+
+                if inspect.isawaitable(result):
+                    await result
+
+            await asyncio.sleep(0)
+
+        async for item in items:
+            if isinstance(item, (str, bytes)):
+                if not item.strip():
+                    continue
 
-                if relations:
-                    self._relations[entity] = relations
+                item = json.loads(item)
 
-                self._entities[key] = entity
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                await flush()
+
+        if batch:
+            await flush()
+
+        return LoadResult(count=count, unresolved=self.unresolved())
 
     def get(self, field, entity_key) -> "Entity":
-        return self._entities.get(EntityRef(field, entity_key))
+        keys = self._entities.get(field)
+
+        return keys.get(entity_key) if keys is not None else None
+
+    def count_keys(self, field: "Field") -> int:
+        """Number of entities in storage available by primary key field"""
+        return len(self._entities.get(field, ()))
 
     def make_key_relation(
         self,
@@ -57,24 +646,79 @@ class Storage:
         to_: t.Union["Entity", "EntityRef"],
         relation_type: t.Any,
     ):
-        # TODO: probably weakref will be better
-        relations = self._relations[from_][type(to_), relation_type]
+        relations = self._get_node_relations(from_, create=True)
+        bucket_key = type(to_), relation_type
+        bucket = relations.get(bucket_key)
+
+        if bucket is None:
+            bucket = relations[bucket_key] = self._make_bucket(from_, bucket_key)
 
-        if to_ not in relations:
-            relations.append(to_)
+        if to_ not in bucket:
+            bucket[to_] = None
         else:
             raise ValueError(
                 f"Relation type {relation_type} already exists "
                 f"between {from_} and {to_}",
             )
 
+    def _make_bucket(
+        self,
+        entity: t.Union["Entity", "EntityRef"],
+        bucket_key: t.Tuple[t.Type["Entity"], t.Any],
+    ) -> t.Dict["Entity", None]:
+        # relations by keys are dropped as soon as all related entities are
+        # gone, relations of entity are dropped together with it
+        if self.weak and isinstance(entity, EntityRef):
+            return WeakBucket(
+                lambda bucket: self._drop_pending(entity, bucket_key, bucket),
+            )
+
+        return self._entity_set()
+
+    def _drop_pending(
+        self,
+        ref: EntityRef,
+        bucket_key: t.Tuple[t.Type["Entity"], t.Any],
+        bucket: WeakBucket,
+    ):
+        nodes = self._pending.get(ref.field)
+        relations = nodes and nodes.get(ref.key)
+
+        if relations is None or relations.get(bucket_key) is not bucket:
+            return
+
+        del relations[bucket_key]
+
+        if not relations:
+            del nodes[ref.key]
+
+            if not nodes:
+                del self._pending[ref.field]
+
     def get_related_entities(
         self,
         entity: ["Entity", "EntityRef"],
         related_entity_type: t.Type["Entity"],
         relation_type: t.Any,
     ) -> t.List["Entity"]:
-        return self._relations[entity][related_entity_type, relation_type]
+        bucket = self._get_bucket(entity, (related_entity_type, relation_type))
+
+        return list(bucket) if bucket else []
+
+    def view_related_entities(
+        self,
+        entity: t.Union["Entity", "EntityRef"],
+        related_entity_type: t.Type["Entity"],
+        relation_type: t.Any,
+    ) -> t.Collection["Entity"]:
+        """Same as `get_related_entities` but without copying
+
+        Returned collection reflects further changes of relations and
+        shouldn't be changed directly.
+        """
+        bucket = self._get_bucket(entity, (related_entity_type, relation_type))
+
+        return () if bucket is None else bucket
 
     def get_one_related_entity(
         self,
@@ -82,10 +726,10 @@ class Storage:
         related_entity_type: t.Type["Entity"],
         relation_type: t.Any,
     ) -> t.Optional["Entity"]:
-        entities = self._relations[entity][related_entity_type, relation_type]
+        bucket = self._get_bucket(entity, (related_entity_type, relation_type))
 
-        if entities:
-            return entities[0]
+        if bucket:
+            return next(iter(bucket))
 
     def remove_relation(
         self,
@@ -93,7 +737,15 @@ class Storage:
         to_: t.Union["Entity", "EntityRef"],
         relation_type: t.Any,
     ) -> t.NoReturn:
-        self._relations[from_][type(to_), relation_type].remove(to_)
+        bucket = self._get_bucket(from_, (type(to_), relation_type))
+
+        if bucket is None or to_ not in bucket:
+            raise ValueError(
+                f"Relation type {relation_type} doesn't exist "
+                f"between {from_} and {to_}",
+            )
+
+        del bucket[to_]
 
     def remove_relations(
         self,
@@ -101,24 +753,252 @@ class Storage:
         related_entity_type: t.Type["Entity"],
         relation_type: t.Any,
     ) -> t.NoReturn:
-        self._relations[entity][related_entity_type, relation_type].clear()
+        bucket = self._get_bucket(entity, (related_entity_type, relation_type))
+
+        if bucket:
+            bucket.clear()
+
+    def defer(self, entity: "Entity", field: "Nested"):
+        fields = self._deferred.get(entity)
+
+        if fields is None:
+            fields = self._deferred[entity] = {}
+
+        fields[field] = None
+
+    def resolve(self, entity: "Entity", field: t.Optional["Nested"] = None):
+        fields = self._deferred.get(entity)
+
+        if not fields:
+            return
+
+        if field is None:
+            del self._deferred[entity]
+
+            for field in fields:
+                field.materialize(entity)
+        elif field in fields:
+            del fields[field]
+
+            if not fields:
+                del self._deferred[entity]
+
+            field.materialize(entity)
+
+    def resolve_all(self):
+        # loaded entities can have own lazy fields, they are resolved as well
+        while self._deferred:
+            self.resolve(next(iter(self._deferred)))
+
+    def dump(self, path: t.Union[str, os.PathLike]):
+        """Save entities with their relations to binary file
+
+        Entity types should be available in registry by full name when
+        storage is loaded back, and values of fields should be picklable.
+        """
+        from corm import snapshot
+
+        snapshot.dump(self, path)
+
+    @classmethod
+    def load(cls, path: t.Union[str, os.PathLike]) -> "Storage":
+        """Restore storage saved by `dump` without loading entities again
+
+        Snapshot is unpickled, so it should come from trusted source only:
+        loading crafted file can run arbitrary code.
+        """
+        from corm import snapshot
+
+        storage = cls()
+        snapshot.load(storage, path)
+
+        return storage
+
+    def dumps(self) -> bytes:
+        from corm import snapshot
+
+        return snapshot.dumps(self)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Storage":
+        """Same as `load` for bytes, data should come from trusted source"""
+        from corm import snapshot
+
+        storage = cls()
+        snapshot.loads(storage, data)
+
+        return storage
+
+    def parallel_load(
+        self,
+        entity_type: t.Type["Entity"],
+        items: t.Iterable[t.Any],
+        workers: t.Optional[int] = None,
+        chunk_size: int = 10000,
+    ) -> t.List["Entity"]:
+        """Load entities in process pool and merge them into storage
+
+        Items are split into chunks loaded by `workers` processes, so entity
+        type should be importable by its module and items picklable.
+        Relations made by keys between chunks are resolved on merge.
+        """
+        from corm.parallel import parallel_load
+
+        return parallel_load(self, entity_type, items, workers, chunk_size)
+
+    def merge(self, other: t.Union["Storage", "Entity"]):
+        """Move entity or all entities of other storage to this storage
+
+        Entities keep their relations, relations made by keys are resolved
+        by entities of both storages. If any primary key is taken already
+        nothing is moved.
+        """
+        if isinstance(other, Storage):
+            self._merge_storage(other)
+        else:
+            self._merge_entity(other)
+
+    def _merge_entity(self, entity: "Entity"):
+        old = entity.storage
+
+        if old is self:
+            return
+
+        for field in entity.__pk_fields__ or ():
+            value = getattr(entity, field.name)
+
+            if value in self._entities.get(field, ()):
+                raise ValueError(f"{field}={value} already in storage")
+
+        relations = old._relations.get(entity)
+        deferred = old._deferred.get(entity)
+        old.remove(entity)
+
+        entity.storage = self
+        self.add(entity)
+        self._add_references(entity)
+
+        if entity.__columns__:
+            entity._data = self._get_table(type(entity)).add(entity, entity._data)
+
+        if relations:
+            self._merge_relations(entity, relations)
+
+        if deferred:
+            for field in deferred:
+                self.defer(entity, field)
+
+        if entity.__index_fields__:
+            self.index(entity)
+
+        # values cached by entity for version of old storage are outdated
+        self.version = max(self.version, old.version) + 1
+
+    def _merge_storage(self, other: "Storage"):
+        if other is self:
+            return
+
+        conflicts = [
+            (field, key)
+            for field, keys in other._entities.items()
+            if field in self._entities
+            for key in keys
+            if key in self._entities[field]
+        ]
+
+        if conflicts:
+            field, value = conflicts[0]
+
+            raise ValueError(
+                f"{field}={value} already in storage "
+                f"({len(conflicts)} conflicting keys)",
+            )
+
+        keys = dict(other._entities)
+        # untracked entities are found by keys and indexes only
+        entities = {
+            entity: None
+            for type_entities in other._get_types().values()
+            for entity in type_entities
+        }
+
+        for field_keys in keys.values():
+            entities.update(dict.fromkeys(field_keys.values()))
+
+        for index in other._indexes.values():
+            entities.update(dict.fromkeys(index.entities()))
+
+        entities = list(entities)
+
+        for entity in entities:
+            entity.storage = self
+
+        for field, field_keys in keys.items():
+            own_keys = self._entities.get(field)
+
+            # keys of field which isn't in storage are taken as is
+            if own_keys is None and other.weak == self.weak:
+                self._entities[field] = field_keys
+            else:
+                self._get_keys(field).update(field_keys)
+
+        types = self._get_types()
+
+        for entity_type, type_entities in other._types.items():
+            own_entities = types.get(entity_type)
+
+            if own_entities is None:
+                own_entities = types[entity_type] = self._entity_set()
+
+            own_entities.update(type_entities)
+
+        for entity_type, table in other._columns.items():
+            self._get_table(entity_type).extend(table)
+
+        for field, keys in other._references.items():
+            for key, referencing in keys.items():
+                for entity in referencing:
+                    self.add_reference(field, key, entity)
+
+        # entities are in one storage at a time, so there is nothing to merge
+        self._relations.update(other._relations)
+        self._deferred.update(other._deferred)
 
-    def merge(self, entity: "Entity"):
-        raise NotImplementedError
+        # relations made by keys of entities which were in other storage
+        if self._pending:
+            self._resolve_refs(keys)
 
-    def select(self, entity_type: t.Type["Entity"]) -> "Query":
-        raise NotImplementedError
+        for field, nodes in other._pending.items():
+            for key, relations in nodes.items():
+                entity = self._entities.get(field, {}).get(key)
+                self._merge_relations(
+                    EntityRef(field, key) if entity is None else entity,
+                    relations,
+                )
 
+        for entity in entities:
+            if entity.__index_fields__:
+                self.index(entity)
 
-class Query:
-    def filter(self, *args, **kwargs) -> "Query":
-        raise NotImplementedError
+        self.version = max(self.version, other.version) + 1
+        other.version = self.version
 
-    def first(self) -> "Entity":
-        raise NotImplementedError
+        for entries in (
+            other._entities,
+            other._types,
+            other._added,
+            other._indexes,
+            other._deferred,
+            other._relations,
+            other._pending,
+            other._references,
+            other._columns,
+            other._column_cache,
+            other._entity_cache,
+        ):
+            entries.clear()
 
-    def one(self) -> "Entity":
-        raise NotImplementedError
+    def select(self, entity_type: t.Type["Entity"]) -> Query:
+        self._check_tracked(entity_type)
 
-    def all(self) -> t.List["Entity"]:
-        raise NotImplementedError
+        return Query(storage=self, entity_type=entity_type)
@@ -0,0 +1,442 @@
+import threading
+import typing as t
+
+from corm.columnar import ColumnTable, Row
+from corm.constants import IndexType
+from corm.index import HashIndex, SortedIndex
+from corm.storage import EntityRef, Storage
+
+if t.TYPE_CHECKING:
+    import numpy as np
+
+    from corm.entity import Entity
+    from corm.fields import Field, KeyNested, Nested
+
+
+class _LockedIndex:
+    # reads of sorted index can reorganize it as well, so every call is
+    # made under lock of index
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.lock = threading.RLock()
+
+    def add(self, entity: "Entity", value: t.Any):
+        with self.lock:
+            super().add(entity, value)
+
+    def remove(self, entity: "Entity", value: t.Any):
+        with self.lock:
+            super().remove(entity, value)
+
+    def get(self, value: t.Any) -> t.Collection["Entity"]:
+        with self.lock:
+            return list(super().get(value))
+
+
+class LockedHashIndex(_LockedIndex, HashIndex):
+    pass
+
+
+class LockedSortedIndex(_LockedIndex, SortedIndex):
+    def bounds(self, *args, **kwargs) -> t.Tuple[int, int]:
+        with self.lock:
+            return super().bounds(*args, **kwargs)
+
+    def iter_range(self, *args, **kwargs) -> t.Iterator["Entity"]:
+        with self.lock:
+            return iter(list(super().iter_range(*args, **kwargs)))
+
+    def get_nones(self) -> t.Collection["Entity"]:
+        with self.lock:
+            return list(super().get_nones())
+
+
+class LockedColumnTable(ColumnTable):
+    # rows are moved and arrays are replaced by changes, so they are made
+    # under lock of table
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.lock = threading.RLock()
+
+    def add(self, entity: "Entity", data: t.Dict[str, t.Any]) -> Row:
+        with self.lock:
+            return super().add(entity, data)
+
+    def set(self, row: Row, name: str, value: t.Any):
+        with self.lock:
+            super().set(row, name, value)
+
+    def remove(self, row: Row):
+        with self.lock:
+            super().remove(row)
+
+    def extend(self, other: ColumnTable):
+        with self.lock:
+            super().extend(other)
+
+    def column(self, name: str) -> "np.ndarray":
+        with self.lock:
+            return super().column(name)
+
+    def entities(self) -> t.List["Entity"]:
+        with self.lock:
+            return super().entities()
+
+
+class ConcurrentStorage(Storage):
+    """Storage which can be filled from many threads at once
+
+    Changes are guarded by striped locks: relations by lock of entity they
+    are made from, primary keys and relations made by keys by lock of key,
+    so threads working with different entities rarely wait for each other.
+    `get`, `get_related_entities` and `get_one_related_entity` don't take
+    locks at all.
+    """
+
+    def __init__(self, stripes: int = 64):
+        super().__init__()
+
+        self._key_locks = [threading.Lock() for _ in range(stripes)]
+        self._node_locks = [threading.Lock() for _ in range(stripes)]
+        self._lock = threading.Lock()
+
+    def _get_lock(self, node: t.Union["Entity", EntityRef]) -> threading.Lock:
+        if isinstance(node, EntityRef):
+            return self._key_locks[hash(node) % len(self._key_locks)]
+
+        return self._node_locks[hash(node) % len(self._node_locks)]
+
+    def _increment_version(self):
+        with self._lock:
+            self.version += 1
+
+    def _get_node_relations(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        create: bool = False,
+    ) -> t.Optional[t.Dict]:
+        if create and isinstance(entity, EntityRef):
+            # dicts of fields are shared by keys guarded by different locks,
+            # so they are never replaced or removed
+            return self._pending.setdefault(entity.field, {}).setdefault(
+                entity.key,
+                {},
+            )
+
+        return super()._get_node_relations(entity, create)
+
+    def _get_keys(self, field: "Field") -> t.Dict[t.Any, "Entity"]:
+        keys = self._entities.get(field)
+
+        if keys is None:
+            with self._lock:
+                keys = self._entities.setdefault(field, self._key_map())
+
+        return keys
+
+    def _resolve_ref(self, field: "Field", value: t.Any, entity: "Entity"):
+        relations = self._pending[field].pop(value, None)
+
+        if relations:
+            with self._get_lock(entity):
+                self._merge_relations(entity, relations)
+
+    def _add_type(self, entity: "Entity"):
+        # entities are registered right away, list of added ones can't be
+        # swapped safely while other threads append to it
+        if not entity.__tracked__:
+            return
+
+        entities = self._types.get(type(entity))
+
+        if entities is None:
+            with self._lock:
+                entities = self._types.setdefault(type(entity), self._entity_set())
+
+        entities[entity] = None
+
+    def add(self, entity: "Entity"):
+        for field in entity.__pk_fields__ or ():
+            value = getattr(entity, field.name)
+            keys = self._get_keys(field)
+
+            with self._get_lock(EntityRef(field, value)):
+                if value in keys:
+                    raise ValueError(f"{field}={value} already in storage")
+
+                keys[value] = entity
+
+                if field in self._pending:
+                    self._resolve_ref(field, value, entity)
+
+        if entity.__pk_fields__:
+            self._increment_version()
+
+        self._add_type(entity)
+
+    def add_many(self, entities: t.Iterable["Entity"]):
+        entities = list(entities)
+        keys = {}
+
+        for entity in entities:
+            for field in entity.__pk_fields__ or ():
+                value = getattr(entity, field.name)
+                key = EntityRef(field, value)
+
+                if key in keys:
+                    raise ValueError(f"{field}={value} already in storage")
+
+                keys[key] = entity
+
+        # locks are always taken in the same order, so batches don't deadlock
+        locks = sorted({id(lock): lock for lock in map(self._get_lock, keys)}.items())
+
+        for _, lock in locks:
+            lock.acquire()
+
+        try:
+            for key in keys:
+                if key.key in self._entities.get(key.field, ()):
+                    raise ValueError(f"{key.field}={key.key} already in storage")
+
+            field_keys = {}
+
+            for key, entity in keys.items():
+                field_keys.setdefault(key.field, {})[key.key] = entity
+
+            for field, values in field_keys.items():
+                self._get_keys(field).update(values)
+
+            self._resolve_refs(field_keys)
+        finally:
+            for _, lock in locks:
+                lock.release()
+
+        if keys:
+            self._increment_version()
+
+        for entity in entities:
+            self._add_type(entity)
+
+    def _add_checked(
+        self,
+        entities: t.List["Entity"],
+        keys: t.Dict["Field", t.Dict[t.Any, "Entity"]],
+    ):
+        # keys are checked again under locks
+        self.add_many(entities)
+
+    def _remove_keys(self, entity: "Entity"):
+        for field in entity.__pk_fields__ or ():
+            value = getattr(entity, field.name)
+            keys = self._entities.get(field)
+
+            if keys is None:
+                continue
+
+            with self._get_lock(EntityRef(field, value)):
+                if keys.get(value) is entity:
+                    del keys[value]
+
+    def _remove_node(self, entity: "Entity"):
+        with self._get_lock(entity):
+            super()._remove_node(entity)
+
+    def _make_index(self, field: "Field") -> t.Union[HashIndex, SortedIndex]:
+        if field.index == IndexType.SORTED:
+            return LockedSortedIndex(field)
+
+        return LockedHashIndex(field)
+
+    def _get_table(self, entity_type: t.Type["Entity"]) -> ColumnTable:
+        table = self._columns.get(entity_type)
+
+        if table is None:
+            with self._lock:
+                table = self._columns.get(entity_type)
+
+                if table is None:
+                    table = self._columns[entity_type] = LockedColumnTable(
+                        entity_type.__columns__,
+                        weak=self.weak,
+                    )
+
+        return table
+
+    def index(self, entity: "Entity"):
+        for field in entity.__index_fields__:
+            index = self._indexes.get(field)
+
+            if index is None:
+                with self._lock:
+                    index = self._indexes.get(field)
+
+                    if index is None:
+                        index = self._indexes[field] = self._make_index(field)
+
+            index.add(entity, getattr(entity, field.name))
+
+    def update_index(
+        self,
+        entity: "Entity",
+        field: "Field",
+        old_value: t.Any,
+        value: t.Any,
+    ):
+        if old_value == value:
+            return
+
+        if field.pk:
+            key = EntityRef(field, value)
+            old_key = EntityRef(field, old_value)
+            locks = sorted(
+                {
+                    id(lock): lock for lock in map(self._get_lock, (key, old_key))
+                }.items(),
+            )
+
+            for _, lock in locks:
+                lock.acquire()
+
+            try:
+                keys = self._get_keys(field)
+
+                if keys.get(old_value) is not entity:
+                    return
+
+                if value in keys:
+                    raise ValueError(f"{field}={value} already in storage")
+
+                del keys[old_value]
+                keys[value] = entity
+
+                if field in self._pending:
+                    self._resolve_ref(field, value, entity)
+            finally:
+                for _, lock in locks:
+                    lock.release()
+
+            self._increment_version()
+        elif not self._contains(entity, field, old_value):
+            return
+
+        index = self._indexes.get(field)
+
+        if index is not None:
+            with index.lock:
+                index.remove(entity, old_value)
+                index.add(entity, value)
+
+    def get_entities(self, entity_type: t.Type["Entity"]) -> t.Iterator["Entity"]:
+        # entities can be added while they are iterated
+        for type_, entities in list(self._types.items()):
+            if issubclass(type_, entity_type):
+                yield from list(entities)
+
+    def make_key_relation(
+        self,
+        field_from: "Field",
+        key_from: t.Any,
+        relation_type: t.Any,
+        to: "Entity",
+    ):
+        key = EntityRef(field=field_from, key=key_from)
+
+        with self._get_lock(key):
+            entity = self.get(field_from, key_from)
+
+            if entity is None:
+                # entity with that key can't appear until lock is released
+                Storage.make_relation(self, key, to, relation_type)
+                return
+
+        self.make_relation(from_=entity, to_=to, relation_type=relation_type)
+
+    def make_relation(
+        self,
+        from_: t.Union["Entity", EntityRef],
+        to_: t.Union["Entity", EntityRef],
+        relation_type: t.Any,
+    ):
+        with self._get_lock(from_):
+            super().make_relation(from_, to_, relation_type)
+
+    def remove_relation(
+        self,
+        from_: t.Union["Entity", EntityRef],
+        to_: t.Union["Entity", EntityRef],
+        relation_type: t.Any,
+    ):
+        with self._get_lock(from_):
+            super().remove_relation(from_, to_, relation_type)
+
+    def remove_relations(
+        self,
+        entity: t.Union["Entity", EntityRef],
+        related_entity_type: t.Type["Entity"],
+        relation_type: t.Any,
+    ):
+        with self._get_lock(entity):
+            super().remove_relations(entity, related_entity_type, relation_type)
+
+    def add_reference(self, field: "KeyNested", key: t.Any, entity: "Entity"):
+        keys = self._references.get(field)
+
+        if keys is None:
+            with self._lock:
+                keys = self._references.setdefault(field, {})
+
+        with self._get_lock(EntityRef(field.related_entity_field, key)):
+            entities = keys.get(key)
+
+            if entities is None:
+                entities = keys[key] = self._entity_set()
+
+            entities[entity] = None
+
+    def remove_reference(self, field: "KeyNested", key: t.Any, entity: "Entity"):
+        with self._get_lock(EntityRef(field.related_entity_field, key)):
+            super().remove_reference(field, key, entity)
+
+    def get_referencing(
+        self,
+        field: "KeyNested",
+        target: t.Union["Entity", t.Any],
+    ) -> t.List["Entity"]:
+        # set of entities can be changed while it is copied
+        key = target
+
+        if isinstance(target, field.related_entity_field.owner):
+            key = getattr(target, field.related_entity_field.name)
+
+        with self._get_lock(EntityRef(field.related_entity_field, key)):
+            return super().get_referencing(field, key)
+
+    def defer(self, entity: "Entity", field: "Nested"):
+        with self._get_lock(entity):
+            super().defer(entity, field)
+
+    def resolve(self, entity: "Entity", field: t.Optional["Nested"] = None):
+        with self._get_lock(entity):
+            fields = self._deferred.get(entity)
+
+            if not fields:
+                return
+
+            if field is None:
+                del self._deferred[entity]
+            elif field in fields:
+                del fields[field]
+
+                if not fields:
+                    del self._deferred[entity]
+
+                fields = (field,)
+            else:
+                return
+
+        # loading makes relations, which take the same lock
+        for field in fields:
+            field.materialize(entity)
@@ -0,0 +1,31 @@
+import typing as t
+
+from corm import (
+    Storage,
+    Entity,
+    KeyNested,
+    CompositeKey,
+)
+
+
+class Account(Entity):
+    tenant_id: int
+    id: int
+    name: str
+    key: t.Tuple[int, int] = CompositeKey("tenant_id", "id")
+
+
+class Order(Entity):
+    account: Account = KeyNested(
+        related_entity_field=Account.key,
+        origin="account_key",
+    )
+
+
+storage = Storage()
+account = Account({"tenant_id": 1, "id": 10, "name": "account"}, storage=storage)
+Account({"tenant_id": 2, "id": 10, "name": "other account"}, storage=storage)
+order = Order({"account_key": [1, 10]}, storage=storage)
+
+assert storage.get(Account.key, (1, 10)) is account
+assert order.account is account
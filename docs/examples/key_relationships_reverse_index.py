@@ -0,0 +1,28 @@
+from corm import (
+    Storage,
+    Field,
+    Entity,
+    KeyNested,
+)
+
+
+class SomeEntity(Entity):
+    id: int = Field(pk=True)
+    name: str
+
+
+class EntityHolder(Entity):
+    name: str
+    entity: SomeEntity = KeyNested(
+        related_entity_field=SomeEntity.id,
+        origin="entity_id",
+        reverse_index=True,
+    )
+
+
+storage = Storage()
+entity = SomeEntity({"id": 123, "name": "entity"}, storage=storage)
+holder = EntityHolder({"name": "holder", "entity_id": 123}, storage=storage)
+
+assert storage.get_referencing(EntityHolder.entity, entity) == [holder]
+assert storage.get_referencing(EntityHolder.entity, 123) == [holder]
@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 
 from corm import registry
@@ -6,3 +8,13 @@ from corm import registry
 @pytest.fixture(autouse=True)
 def clear_registry():
     registry.clear()
+
+
+@pytest.fixture
+def switch_often():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    yield
+
+    sys.setswitchinterval(interval)
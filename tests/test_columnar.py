@@ -0,0 +1,295 @@
+import gc
+import typing as t
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from corm import (
+    ConcurrentStorage,
+    Entity,
+    Field,
+    IndexType,
+    MappedStorage,
+    Storage,
+)
+
+np = pytest.importorskip("numpy")
+
+
+def test_columnar_entity():
+    class Tick(Entity):
+        class Config:
+            columnar = True
+
+        id: int = Field(pk=True)
+        symbol: str
+        price: float = Field(index=IndexType.SORTED)
+        volume: int
+        up: bool
+
+    assert set(Tick.__columns__) == {"id", "price", "volume", "up"}
+
+    storage = Storage()
+    ticks = Tick.load_many(
+        [
+            {"id": i, "symbol": "A", "price": i / 2, "volume": i, "up": i % 2 == 0}
+            for i in range(5)
+        ],
+        storage,
+    )
+
+    assert storage.column(Tick.price).tolist() == [0, 0.5, 1, 1.5, 2]
+    assert storage.column(Tick.volume).sum() == 10
+    assert storage.column(Tick.up).dtype == np.bool_
+    assert storage.column_entities(Tick) == ticks
+
+    tick = ticks[1]
+
+    assert type(tick.volume) is int
+    assert tick.dict() == {
+        "id": 1,
+        "symbol": "A",
+        "price": 0.5,
+        "volume": 1,
+        "up": False,
+    }
+
+    tick.price = 10.0
+
+    assert storage.column(Tick.price)[1] == 10
+    assert storage.select(Tick).filter(price__gt=5).all() == [tick]
+
+    with pytest.raises(ValueError):
+        tick.price = None
+
+    # values are never cast with loss
+    for field, value in (("volume", 1.7), ("volume", "5"), ("up", "no")):
+        with pytest.raises(ValueError):
+            setattr(tick, field, value)
+
+    with pytest.raises(ValueError):
+        tick.volume = 2**63
+
+    with pytest.raises(ValueError):
+        Tick({"id": 9, "symbol": "A", "price": 1, "volume": 1.5, "up": True}, Storage())
+
+    tick.volume = np.int32(1)
+    tick.price = np.float32(10)
+
+    assert tick.price == 10
+
+    with pytest.raises(ValueError):
+        storage.column(Tick.symbol)
+
+    with pytest.raises(ValueError):
+        storage.column(Tick.price)[0] = 1
+
+    # last row takes place of removed one
+    storage.remove(ticks[0])
+
+    assert storage.column(Tick.id).tolist() == [4, 1, 2, 3]
+    assert ticks[0].dict()["price"] == 0
+
+    restored = Storage.loads(storage.dumps())
+
+    assert sorted(restored.column(Tick.id).tolist()) == [1, 2, 3, 4]
+    assert restored.get(Tick.id, 1).price == 10
+    assert sorted(MappedStorage(storage.dumps()).column(Tick.volume)) == [1, 2, 3, 4]
+
+    other = Storage()
+    Tick.load_many(
+        [{"id": 10, "symbol": "B", "price": 1, "volume": 1, "up": True}],
+        other,
+    )
+    other.merge(storage)
+
+    assert other.column(Tick.id).tolist() == [10, 4, 1, 2, 3]
+    assert [tick.id for tick in other.column_entities(Tick)] == [10, 4, 1, 2, 3]
+    assert len(storage.column(Tick.id)) == 0
+
+
+def test_columnar_weak_storage():
+    class Point(Entity):
+        class Config:
+            columnar = True
+            slots = True
+
+        x: int
+        y: int
+
+    storage = Storage(weak=True)
+    points = Point.load_many([{"x": i, "y": -i} for i in range(4)], storage)
+
+    del points[0]
+    gc.collect()
+
+    assert storage.column(Point.x).tolist() == [3, 1, 2]
+    assert storage.column(Point.y).tolist() == [-3, -1, -2]
+
+
+def test_columnar_concurrent_storage(switch_often):
+    class Tick(Entity):
+        class Config:
+            columnar = True
+
+        id: int = Field(pk=True)
+        price: int
+
+    storage = ConcurrentStorage()
+    count = 4000
+    removed = []
+
+    def load(chunk):
+        # table grows and rows are moved by other threads meanwhile
+        for i in chunk:
+            tick = Tick({"id": i, "price": i}, storage)
+            tick.price = i * 2
+
+            if i % 2:
+                storage.remove(tick)
+                removed.append(tick)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(load, [range(i, count, 8) for i in range(8)]))
+
+    ticks = storage.column_entities(Tick)
+
+    assert sorted(tick.id for tick in ticks) == list(range(0, count, 2))
+    assert [tick.price for tick in ticks] == [tick.id * 2 for tick in ticks]
+    assert storage.column(Tick.price).tolist() == [tick.id * 2 for tick in ticks]
+    assert storage.get(Tick.id, 1) is None
+    assert all(tick.price == tick.id * 2 for tick in removed)
+
+
+def test_batch():
+    class User(Entity):
+        id: int = Field(pk=True)
+        country: str
+        age: int
+        score: float
+
+    class Tick(Entity):
+        class Config:
+            columnar = True
+
+        symbol: str
+        volume: int
+
+    storage = Storage()
+    users = User.load_many(
+        [
+            {"id": 1, "country": "ru", "age": 20, "score": 1.5},
+            {"id": 2, "country": "us", "age": 30, "score": 2.5},
+            {"id": 3, "country": "ru", "age": 40, "score": 3.5},
+            {"id": 4, "country": "de", "age": 50, "score": 4.5},
+        ],
+        storage,
+    )
+    batch = storage.batch(User)
+
+    assert batch.count() == 4
+    assert batch.sum("age") == 140
+    assert batch.min(User.score) == 1.5
+    assert batch.max("age") == 50
+    assert batch.mean("age") == 35
+    assert batch.group_by("country").count() == {"de": 1, "ru": 2, "us": 1}
+    assert batch.group_by("country").sum("age") == {"de": 50, "ru": 60, "us": 30}
+    assert batch.group_by("country").mean("score") == {"de": 4.5, "ru": 2.5, "us": 2.5}
+    assert batch.group_by("country").max("age") == {"de": 50, "ru": 40, "us": 30}
+
+    adults = batch.filter(age__gt=25, country__in=["ru", "us"])
+
+    assert adults.all() == users[1:3]
+    assert adults.sum("age") == 70
+    assert adults.group_by("country").min("age") == {"ru": 40, "us": 30}
+    assert batch.filter(
+        lambda batch: batch.column("age") < batch.column("score") * 12
+    ).all() == [users[2], users[3]]
+    assert batch.filter(age__gt=100).mean("age") is None
+
+    # extracted values are dropped when field is set
+    users[0].age = 100
+
+    assert batch.max("age") == 100
+    assert batch.filter(age__between=(90, 100)).all() == [users[0]]
+
+    User(data={"id": 5, "country": "ru", "age": 10, "score": 0}, storage=storage)
+
+    assert batch.group_by("country").count() == {"de": 1, "ru": 3, "us": 1}
+
+    storage.remove(users[3])
+
+    assert batch.group_by("country").count() == {"ru": 3, "us": 1}
+
+    with pytest.raises(ValueError):
+        batch.filter(age__like=1)
+
+    with pytest.raises(ValueError):
+        batch.sum("height")
+
+    Tick.load_many(
+        [
+            {"symbol": "a", "volume": 1},
+            {"symbol": "b", "volume": 2},
+            {"symbol": "a", "volume": 3},
+        ],
+        storage,
+    )
+    ticks = storage.batch(Tick)
+
+    assert ticks.group_by("symbol").sum("volume") == {"a": 4, "b": 2}
+    assert ticks.filter(volume__ge=2).count() == 2
+
+
+def test_batch_optional_values():
+    class User(Entity):
+        id: int = Field(pk=True)
+        country: t.Optional[str]
+        age: t.Optional[int]
+
+    storage = Storage()
+    users = User.load_many(
+        [
+            {"id": 1, "country": "ru", "age": 20},
+            {"id": 2, "country": None, "age": None},
+            {"id": 3, "country": "ru", "age": 40},
+            {"id": 4, "country": "us", "age": None},
+        ],
+        storage,
+    )
+    batch = storage.batch(User)
+
+    # entities without value are skipped the same way as by queries
+    for kwargs in (
+        {"age__gt": 0},
+        {"age__between": (0, 100)},
+        {"age": None},
+        {"age__ne": 20},
+        {"age__in": [20, None]},
+        {"country": "ru", "age__lt": 30},
+    ):
+        assert (
+            batch.filter(**kwargs).all()
+            == storage.select(User)
+            .filter(
+                **kwargs,
+            )
+            .all()
+        )
+
+    assert batch.filter(lambda batch: batch.column("age") > 30).all() == [users[2]]
+    assert batch.count() == 4
+    assert batch.sum("age") == 60
+    assert batch.min("age") == 20
+    assert batch.mean("age") == 30
+    assert batch.filter(age=None).max("age") is None
+    assert batch.group_by("country").count() == {"ru": 2, "us": 1, None: 1}
+    assert batch.group_by("country").sum("age") == {"ru": 60, "us": 0, None: 0}
+    assert batch.group_by("country").mean("age") == {"ru": 30, "us": None, None: None}
+    assert batch.group_by("age").count() == {20: 1, 40: 1, None: 2}
+    assert batch.filter(age__gt=0).group_by("age").max("age") == {20: 20, 40: 40}
+
+    users[1].age = 10
+
+    assert batch.filter(age__lt=30).all() == [users[0], users[1]]
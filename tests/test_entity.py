@@ -138,3 +138,55 @@ def test_change_field_value():
         "name": "john",
         "description": "cool guy",
     }
+
+
+def test_load_fields():
+    class User(Entity):
+        id: int
+        name: str = Field(default="Bob")
+        guid: str = Field(mode=AccessMode.GET_DUMP)
+        tags: list = Field(default=list)
+
+    storage = Storage()
+    user1 = User({"id": 1}, storage)
+    user2 = User({"id": 2, "name": "John", "tags": ["admin"]}, storage)
+
+    assert user1.dict() == {"id": 1, "name": "Bob", "guid": None, "tags": []}
+    assert user2.dict() == {
+        "id": 2,
+        "name": "John",
+        "guid": None,
+        "tags": ["admin"],
+    }
+    assert user1.tags is not User({"id": 3}, storage).tags
+
+    with pytest.raises(ValueError, match="'id'"):
+        User({"name": "John"}, storage)
+
+
+def test_slots():
+    class User(Entity):
+        class Config:
+            slots = True
+
+        id: int
+        name: str = Field(default="Bob")
+
+    class Admin(User):
+        level: int = 1
+
+    storage = Storage()
+    user = User({"id": 1}, storage)
+    admin = Admin({"id": 2, "name": "John"}, storage)
+
+    assert not hasattr(user, "__dict__")
+    assert not hasattr(admin, "__dict__")
+    assert Admin.__slots__ == ()
+
+    user.name = "John"
+
+    assert user.dict() == {"id": 1, "name": "John"}
+    assert admin.dict() == {"id": 2, "name": "John", "level": 1}
+
+    with pytest.raises(AttributeError):
+        user.something = 1
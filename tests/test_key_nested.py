@@ -1,8 +1,19 @@
+import gc
 import typing as t
 
 import pytest
 
-from corm import Entity, Field, KeyNested, Storage, Relationship, KeyManager
+from corm import (
+    CompositeKey,
+    ConcurrentStorage,
+    Entity,
+    Field,
+    KeyManager,
+    KeyNested,
+    Relationship,
+    RelationType,
+    Storage,
+)
 
 
 def test_nested_key():
@@ -219,3 +230,219 @@ def test_change_key_value():
 
     assert holder.entity == entity
     assert holder.dict() == {"entity_id": 321}
+
+
+def test_unresolved_keys():
+    class SomeEntity(Entity):
+        id: int = Field(pk=True)
+        holders: t.List["EntityHolder"] = Relationship(  # noqa: F821
+            entity_type="EntityHolder",
+            many=True,
+        )
+
+    class EntityHolder(Entity):
+        entities: t.List[SomeEntity] = KeyNested(
+            related_entity_field=SomeEntity.id,
+            origin="entity_ids",
+            many=True,
+            back_relation=True,
+        )
+
+    storage = Storage()
+    holder1 = EntityHolder({"entity_ids": [1, 2]}, storage=storage)
+    holder2 = EntityHolder({"entity_ids": [2, 3]}, storage=storage)
+
+    assert storage.unresolved() == [
+        (SomeEntity.id, 1),
+        (SomeEntity.id, 2),
+        (SomeEntity.id, 3),
+    ]
+
+    entity1, entity2 = SomeEntity.load_many([{"id": 1}, {"id": 2}], storage)
+
+    assert storage.unresolved() == [(SomeEntity.id, 3)]
+    assert entity1.holders == [holder1]
+    assert entity2.holders == [holder1, holder2]
+
+    entity3 = SomeEntity({"id": 3}, storage)
+
+    assert storage.unresolved() == []
+    assert entity3.holders == [holder2]
+    assert holder2.entities == [entity2, entity3]
+
+
+def test_resolved_value_cache():
+    class SomeEntity(Entity):
+        id: int = Field(pk=True)
+
+    class EntityHolder(Entity):
+        class Config:
+            slots = True
+
+        entity: SomeEntity = KeyNested(
+            related_entity_field=SomeEntity.id,
+            origin="entity_id",
+            required=False,
+        )
+        entities: t.List[SomeEntity] = KeyNested(
+            related_entity_field=SomeEntity.id,
+            origin="entity_ids",
+            many=True,
+            required=False,
+        )
+
+    storage = Storage()
+    entity1 = SomeEntity({"id": 1}, storage)
+    holder = EntityHolder({"entity_id": 1, "entity_ids": [1, 2]}, storage)
+
+    assert holder.entity is entity1
+    assert holder.entities == [entity1]
+
+    # returned list is a copy, cached entities stay as they are
+    holder.entities.append(entity1)
+
+    assert holder.entities == [entity1]
+
+    entity2 = SomeEntity({"id": 2}, storage)
+
+    assert holder.entities == [entity1, entity2]
+
+    holder.entity = entity2
+
+    assert holder.entity is entity2
+    assert holder.dict() == {"entity_id": 2, "entity_ids": [1, 2]}
+
+    storage.remove(entity2)
+
+    assert holder.entity is None
+    assert holder.entities == [entity1]
+    assert storage.select(SomeEntity).all() == [entity1]
+
+    entity3 = SomeEntity({"id": 2}, storage)
+
+    assert holder.entity is entity3
+
+
+def test_reverse_index():
+    class User(Entity):
+        id: int = Field(pk=True)
+        manager: "User" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="manager_id",
+            required=False,
+            reverse_index=True,
+        )
+        friends: t.List["User"] = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="friend_ids",
+            many=True,
+            default=list,
+            reverse_index=True,
+        )
+
+    storage = Storage()
+    boss, john, jane = User.load_many(
+        [
+            {"id": 1, "manager_id": None},
+            {"id": 2, "manager_id": 1, "friend_ids": [3]},
+            {"id": 3, "manager_id": 1, "friend_ids": [2, 4]},
+        ],
+        storage,
+    )
+
+    assert storage.get_referencing(User.manager, boss) == [john, jane]
+    assert storage.get_referencing(User.manager, 1) == [john, jane]
+    assert storage.get_referencing(User.friends, john) == [jane]
+    # key of entity which isn't loaded yet
+    assert storage.get_referencing(User.friends, 4) == [jane]
+    assert storage.get_referencing(User.manager, john) == []
+
+    jane.manager = john
+    john.friends = []
+
+    assert storage.get_referencing(User.manager, boss) == [john]
+    assert storage.get_referencing(User.manager, john) == [jane]
+    assert storage.get_referencing(User.friends, jane) == []
+
+    restored = Storage()
+    User(data={"id": 10, "manager_id": 1}, storage=restored)
+    restored.merge(Storage.loads(storage.dumps()))
+
+    assert {user.id for user in restored.get_referencing(User.manager, 1)} == {2, 10}
+
+    storage.remove(jane)
+
+    assert storage.get_referencing(User.manager, john) == []
+    assert storage.get_referencing(User.friends, 4) == []
+
+    with pytest.raises(ValueError):
+        storage.get_referencing(User.id, 1)
+
+
+def test_reverse_index_remove():
+    class Target(Entity):
+        id: int = Field(pk=True)
+
+    class Holder(Entity):
+        target: Target = KeyNested(
+            related_entity_field=Target.id,
+            origin="target_id",
+            reverse_index=True,
+        )
+
+    for storage in (Storage(), ConcurrentStorage()):
+        holder = Holder({"target_id": 1}, storage)
+        storage.remove(holder)
+
+        assert storage.get_referencing(Holder.target, 1) == []
+
+    storage = Storage(weak=True)
+    Holder.load_many([{"target_id": i} for i in range(100)], storage)
+    gc.collect()
+
+    assert storage.get_referencing(Holder.target, 1) == []
+    assert storage._references[Holder.target] == {}
+
+
+def test_composite_key():
+    class Account(Entity):
+        tenant_id: int
+        id: int
+        key: t.Tuple[int, int] = CompositeKey("tenant_id", "id")
+
+    class Order(Entity):
+        id: int = Field(pk=True)
+        account: Account = KeyNested(
+            related_entity_field=Account.key,
+            origin="account_key",
+            back_relation=True,
+            reverse_index=True,
+        )
+        accounts: t.List[Account] = KeyNested(
+            related_entity_field=Account.key,
+            origin="account_keys",
+            many=True,
+            required=False,
+        )
+
+    storage = Storage()
+    order = Order(
+        {"id": 1, "account_key": [1, 10], "account_keys": [[1, 10], [2, 10]]},
+        storage=storage,
+    )
+    first, second = Account.load_many(
+        [{"tenant_id": 1, "id": 10}, {"tenant_id": 2, "id": 10}],
+        storage,
+    )
+
+    assert order.account is first
+    assert order.accounts == [first, second]
+    assert storage.get_referencing(Order.account, first) == [order]
+    assert storage.get_referencing(Order.account, (1, 10)) == [order]
+    assert storage.get_related_entities(first, Order, RelationType.RELATED) == [order]
+
+    order.account = second
+
+    assert order.dict()["account_key"] == (2, 10)
+    assert storage.get_referencing(Order.account, first) == []
+    assert storage.get_referencing(Order.account, second) == [order]
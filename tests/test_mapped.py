@@ -0,0 +1,80 @@
+import typing as t
+
+import pytest
+
+from corm import (
+    Entity,
+    Field,
+    KeyNested,
+    MappedStorage,
+    Nested,
+    Relationship,
+    Storage,
+)
+
+
+def test_mapped_storage(tmp_path):
+    class Address(Entity):
+        street: str
+        user: "User" = Relationship(entity_type="User")  # noqa: F821
+
+    class User(Entity):
+        id: int = Field(pk=True)
+        name: str = Field(pk=True)
+        manager: "User" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="manager_id",
+            back_relation=True,
+            required=False,
+        )
+        addresses: t.List[Address] = Nested(
+            entity_type=Address,
+            back_relation=True,
+            many=True,
+        )
+
+    storage = Storage()
+    User.load_many(
+        [
+            {
+                "id": 1,
+                "name": "John",
+                "manager_id": 3,
+                "addresses": [{"street": "kirova 1"}, {"street": "kirova 2"}],
+            },
+            {"id": 2, "name": "Jane", "manager_id": 1, "addresses": []},
+        ],
+        storage,
+    )
+    path = tmp_path / "storage.corm"
+    storage.dump(path)
+
+    mapped = MappedStorage.open(path)
+    john = mapped.get(User.id, 1)
+    jane = mapped.get(User.name, "Jane")
+
+    assert john.name == "John"
+    assert mapped.get(User.id, 1) is john
+    assert mapped.get(User.id, 4) is None
+    assert mapped.get(User.name, "Bob") is None
+    assert jane.manager is john
+    assert john.manager is None
+    assert john.addresses[1].street == "kirova 2"
+    assert john.addresses[0].user is john
+    assert mapped.unresolved() == [(User.id, 3)]
+    assert mapped.select(User).filter(name="Jane").one() is jane
+    assert mapped.select(Address).filter(street="kirova 1").one().user is john
+    assert john.dict() == storage.get(User.id, 1).dict(snapshot=True)
+
+    with pytest.raises(ValueError):
+        john.name = "Bob"
+
+    with pytest.raises(ValueError):
+        User({"id": 3, "name": "Bob", "addresses": []}, mapped)
+
+    loaded = Storage.loads(mapped.dumps())
+
+    assert loaded.get(User.id, 2).manager is loaded.get(User.id, 1)
+
+    del john, jane
+    mapped.close()
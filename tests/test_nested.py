@@ -2,7 +2,7 @@ import typing as t
 
 import pytest
 
-from corm import Storage, Entity, Field, Nested, Relationship
+from corm import Storage, Entity, Field, Nested, Relationship, AccessMode
 
 
 def test_nested():
@@ -324,3 +324,153 @@ def test_change_back_relationship_when_many():
 
     with pytest.raises(ValueError):
         john.addresses = None
+
+
+def test_dict_nested_destination():
+    class Address(Entity):
+        street: str = Field(origin="_street", destination="street")
+        number: int = Field(mode=AccessMode.GET_DUMP)
+
+    class User(Entity):
+        id: int
+        address: Address = Nested(entity_type=Address, destination="addr")
+        addresses: t.List[Address] = Nested(entity_type=Address, many=True)
+
+    storage = Storage()
+    john = User(
+        data={
+            "id": 1,
+            "address": {"_street": "kirova", "number": 1},
+            "addresses": [{"_street": "lenina"}, {"_street": "mira"}],
+        },
+        storage=storage,
+    )
+
+    assert john.dict() == {
+        "id": 1,
+        "addr": {"street": "kirova", "number": 1},
+        "addresses": [
+            {"street": "lenina", "number": None},
+            {"street": "mira", "number": None},
+        ],
+    }
+
+
+def test_dict_snapshot():
+    class Address(Entity):
+        street: str = Field(origin="_street", destination="street")
+
+    class User(Entity):
+        id: int
+        address: Address = Nested(entity_type=Address, destination="addr")
+        addresses: t.List[Address] = Nested(entity_type=Address, many=True)
+
+    storage = Storage()
+    john = User(
+        data={
+            "id": 1,
+            "description": "john smith",
+            "address": {"_street": "kirova"},
+            "addresses": [{"_street": "lenina"}, {"_street": "mira"}],
+        },
+        storage=storage,
+    )
+    expected = {
+        "id": 1,
+        "description": "john smith",
+        "addr": {"street": "kirova"},
+        "addresses": [{"street": "lenina"}, {"street": "mira"}],
+    }
+
+    assert john.dict(snapshot=True) == expected
+    assert john.dict(snapshot=True) == expected
+    assert john.address.street == "kirova"
+    assert john.addresses[1].street == "mira"
+    assert john.dict() == expected
+
+
+def test_iter_dump():
+    class Address(Entity):
+        street: str = Field(origin="_street", destination="street")
+
+    class User(Entity):
+        id: int
+        address: Address = Nested(entity_type=Address, destination="addr")
+        addresses: t.List[Address] = Nested(entity_type=Address, many=True)
+        tags: t.List[Address] = Nested(entity_type=Address, many=True)
+
+    storage = Storage()
+    john = User(
+        data={
+            "id": 1,
+            "address": {"_street": "kirova"},
+            "addresses": [{"_street": "lenina"}, {"_street": "mira"}],
+            "tags": [],
+        },
+        storage=storage,
+    )
+
+    assert list(john.iter_dump()) == [
+        (("id",), 1),
+        (("addr", "street"), "kirova"),
+        (("addresses", 0, "street"), "lenina"),
+        (("addresses", 1, "street"), "mira"),
+        (("tags",), []),
+    ]
+    assert john.address.street == "kirova"
+
+
+def test_lazy():
+    class Address(Entity):
+        id: int = Field(pk=True)
+        street: str
+        user: "User" = Relationship(entity_type="User")
+
+    class User(Entity):
+        id: int
+        address: Address = Nested(entity_type=Address, lazy=True, back_relation=True)
+        addresses: t.List[Address] = Nested(
+            entity_type=Address,
+            many=True,
+            lazy=True,
+            back_relation=True,
+        )
+
+    storage = Storage()
+    john = User(
+        data={
+            "id": 1,
+            "address": {"id": 1, "street": "kirova"},
+            "addresses": [{"id": 2, "street": "lenina"}],
+        },
+        storage=storage,
+    )
+
+    assert storage.get(Address.id, 1) is None
+    assert john.address.street == "kirova"
+    assert storage.get(Address.id, 1) is john.address
+    assert john.address.user is john
+    assert storage.get(Address.id, 2) is None
+
+    storage.resolve_all()
+
+    address = storage.get(Address.id, 2)
+
+    assert john.addresses == [address]
+    assert address.user is john
+
+    bob = User(
+        data={
+            "id": 2,
+            "address": {"id": 3, "street": "mira"},
+            "addresses": [],
+        },
+        storage=storage,
+    )
+
+    assert bob.dict(snapshot=True) == {
+        "id": 2,
+        "address": {"id": 3, "street": "mira"},
+        "addresses": [],
+    }
+    assert storage.get(Address.id, 3) is bob.address
@@ -0,0 +1,136 @@
+import pytest
+
+from corm import Entity, Field, IndexType, Storage
+
+
+def test_select():
+    class User(Entity):
+        id: int = Field(pk=True)
+        email: str = Field(index=True)
+        name: str
+
+    class Admin(User):
+        level: int = 1
+
+    storage = Storage()
+    john = User({"id": 1, "email": "john@mail.com", "name": "John"}, storage)
+    bob = User({"id": 2, "email": "bob@mail.com", "name": "Bob"}, storage)
+    admin = Admin({"id": 3, "email": "admin@mail.com", "name": "Bob"}, storage)
+
+    assert storage.select(User).all() == [john, bob, admin]
+    assert storage.select(Admin).all() == [admin]
+    assert storage.select(User).filter(id=2).one() is bob
+    assert storage.select(User).filter(email="john@mail.com").one() is john
+    assert storage.select(User).filter(name="Bob").all() == [bob, admin]
+    assert storage.select(Admin).filter(email="bob@mail.com").first() is None
+    assert (
+        storage.select(User).filter(name="Bob").filter(lambda u: u.id > 2).one()
+        is admin
+    )
+
+    with pytest.raises(ValueError):
+        storage.select(User).filter(name="Bob").one()
+
+    with pytest.raises(ValueError):
+        storage.select(User).filter(name="John", id=2).one()
+
+    with pytest.raises(ValueError):
+        storage.select(User).filter(address="First st. 1")
+
+
+def test_select_changed_value():
+    class User(Entity):
+        id: int = Field(pk=True)
+        email: str = Field(index=True)
+
+    storage = Storage()
+    users = User.load_many(
+        [{"id": i, "email": f"user{i}@mail.com"} for i in range(10)],
+        storage,
+    )
+
+    assert storage.select(User).filter(email="user5@mail.com").one() is users[5]
+
+    users[5].email = "john@mail.com"
+    users[5].id = 100
+
+    assert storage.select(User).filter(email="user5@mail.com").first() is None
+    assert storage.select(User).filter(email="john@mail.com").one() is users[5]
+    assert storage.select(User).filter(id=100).one() is users[5]
+    assert storage.get(User.id, 5) is None
+
+    with pytest.raises(ValueError):
+        users[6].id = 100
+
+
+def test_select_range():
+    class Tick(Entity):
+        id: int = Field(pk=True)
+        price: float = Field(index=IndexType.SORTED)
+        volume: int = Field(index=True)
+        created_at: int
+
+    storage = Storage()
+    ticks = Tick.load_many(
+        [
+            {"id": i, "price": (i * 7) % 10, "volume": i % 3, "created_at": i}
+            for i in range(10)
+        ],
+        storage,
+    )
+    empty = Tick({"id": 10, "price": None, "volume": 0, "created_at": 10}, storage)
+
+    def prices(query):
+        return [tick.price for tick in query]
+
+    query = storage.select(Tick)
+
+    assert prices(query.filter(price__gt=6)) == [7, 8, 9]
+    assert prices(query.filter(price__between=(2, 4))) == [2, 3, 4]
+    assert prices(query.filter(price__ge=2, price__lt=5, volume=0)) == [2, 3]
+    assert prices(query.filter(price=3)) == [3]
+    assert prices(query.filter(price__in=(3, 5))) == [5, 3]
+    assert prices(query.order_by("price").limit(3)) == [0, 1, 2]
+    assert prices(query.order_by("-price").limit(2)) == [9, 8]
+    assert prices(query.order_by("price"))[-1] is None
+    assert prices(query.filter(created_at__lt=5).order_by("-price")) == [8, 7, 4, 1, 0]
+    assert prices(query.filter(price__ge=1, volume=0).order_by("-created_at")) == [
+        3,
+        2,
+        1,
+    ]
+    assert query.filter(price__lt=5).order_by("-price").first() is ticks[2]
+
+    assert prices(query.filter(volume=0).order_by("-price")) == [3, 2, 1, 0, None]
+    assert prices(query.filter(volume=0).order_by("price")) == [0, 1, 2, 3, None]
+
+    ticks[2].price = 100
+    empty.price = 1
+
+    assert query.order_by("-price").first() is ticks[2]
+    assert prices(query.filter(price=1)) == [1, 1]
+    assert prices(query.filter(price__gt=8)) == [9, 100]
+
+    with pytest.raises(ValueError):
+        query.filter(price__like=1)
+
+
+def test_select_range_reindex():
+    class Tick(Entity):
+        id: int = Field(pk=True)
+        price: float = Field(index=IndexType.SORTED)
+
+    storage = Storage()
+    ticks = Tick.load_many([{"id": i, "price": i} for i in range(10)], storage)
+
+    # entities are moved in index while query iterates over it
+    for tick in storage.select(Tick).filter(price__lt=5):
+        tick.price += 10
+
+    assert [tick.price for tick in ticks] == [10, 11, 12, 13, 14, 5, 6, 7, 8, 9]
+
+    for tick in storage.select(Tick).order_by("-price"):
+        tick.price = None if tick.price > 10 else -tick.price
+
+    assert storage.select(Tick).filter(price__ge=0).all() == []
+    assert len(storage.select(Tick).filter(price=None).all()) == 4
@@ -154,3 +154,59 @@ def test_assign_new_value_to_relationship():
         )
         == []
     )
+
+
+def test_relationship_view():
+    class SomeEntity(Entity):
+        name: str
+
+    class ManyEntityHolder(Entity):
+        name: str
+        entities: t.List[SomeEntity] = Relationship(
+            entity_type=SomeEntity,
+            many=True,
+        )
+
+    storage = Storage()
+    holder = ManyEntityHolder(data={"name": "holder"}, storage=storage)
+    entity1, entity2, entity3 = SomeEntity.load_many(
+        [{"name": "entity1"}, {"name": "entity2"}, {"name": "entity3"}],
+        storage,
+    )
+    entities = holder.entities
+
+    assert len(entities) == 0
+    assert not entities
+
+    entities.extend([entity1, entity2])
+    holder.entities.append(entity3)
+
+    assert len(entities) == 3
+    assert entity2 in entities
+    assert entities[0] is entity1
+    assert entities[-1] is entity3
+    assert entities[1:] == [entity2, entity3]
+    assert list(entities) == [entity1, entity2, entity3]
+
+    with pytest.raises(IndexError):
+        entities[3]
+
+    entities.remove(entity2)
+
+    assert entity2 not in holder.entities
+    assert entities == [entity1, entity3]
+
+    holder.entities = holder.entities
+
+    assert entities == [entity1, entity3]
+
+    entities.clear()
+
+    assert holder.entities == []
+
+    holder.entities.extend([entity1, entity2, entity3])
+
+    for entity in holder.entities:
+        holder.entities.remove(entity)
+
+    assert holder.entities == []
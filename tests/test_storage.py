@@ -1,4 +1,22 @@
-from corm import Entity, Field, Storage, RelationType
+import asyncio
+import gc
+import typing as t
+import weakref
+
+import pytest
+
+from corm import (
+    CompositeKey,
+    Entity,
+    Field,
+    IndexType,
+    KeyNested,
+    Nested,
+    Relationship,
+    Storage,
+    RelationType,
+)
+from corm import registry, snapshot
 
 
 def test_add_by_primary_key():
@@ -14,6 +32,38 @@ def test_add_by_primary_key():
     assert storage.get(User.id, 1) == john
 
 
+def test_count_keys():
+    class User(Entity):
+        id: int = Field(pk=True)
+        email: str = Field(pk=True)
+
+    storage = Storage()
+    john = User(
+        data={"id": 1, "email": "john@mail.com"},
+        storage=storage,
+    )
+    jane, bob = User.load_many(
+        [{"id": 2, "email": "jane@mail.com"}, {"id": 3, "email": "bob@mail.com"}],
+        storage,
+    )
+
+    assert storage.get(User.id, 1) == john
+    assert storage.get(User.email, "jane@mail.com") == jane
+    assert storage.get(User.id, 4) is None
+    assert storage.count_keys(User.id) == 3
+
+    with pytest.raises(ValueError):
+        User.load_many([{"id": 4, "email": "bob@mail.com"}], storage)
+
+    storage.remove(bob)
+    jane.id = 5
+
+    assert storage.get(User.id, 2) is None
+    assert storage.get(User.id, 5) == jane
+    assert storage.count_keys(User.id) == 2
+    assert storage.count_keys(User.email) == 2
+
+
 def test_make_relation():
     class User(Entity):
         id: int
@@ -152,3 +202,604 @@ def test_remove_relations():
         Address,
         RelationType.PARENT,
     ) == [address3]
+
+
+def test_relation_order():
+    class User(Entity):
+        id: int
+
+    class Address(Entity):
+        id: int
+
+    storage = Storage()
+    user = User(data={"id": 1}, storage=storage)
+    address1, address2, address3 = (
+        Address(data={"id": i}, storage=storage) for i in range(1, 4)
+    )
+
+    for address in (address1, address2, address3):
+        storage.make_relation(user, address, RelationType.RELATED)
+
+    storage.remove_relation(user, address2, RelationType.RELATED)
+    storage.make_relation(user, address2, RelationType.RELATED)
+
+    # relation made again goes to the end
+    assert storage.get_related_entities(user, Address, RelationType.RELATED) == [
+        address1,
+        address3,
+        address2,
+    ]
+
+    with pytest.raises(ValueError):
+        storage.make_relation(user, address1, RelationType.RELATED)
+
+    storage.remove_relation(user, address1, RelationType.RELATED)
+
+    with pytest.raises(ValueError):
+        storage.remove_relation(user, address1, RelationType.RELATED)
+
+    with pytest.raises(ValueError):
+        storage.remove_relation(user, address1, RelationType.PARENT)
+
+    assert storage.get_related_entities(user, Address, RelationType.RELATED) == [
+        address3,
+        address2,
+    ]
+
+
+def test_load_many():
+    class Item(Entity):
+        id: int = Field(pk=True)
+        parent: "Item" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="parent_id",
+            back_relation=True,
+            required=False,
+        )
+        children: t.List["Item"] = Relationship(  # noqa: F821
+            entity_type="Item",
+            many=True,
+        )
+
+    storage = Storage()
+    item3, item1, item2 = Item.load_many(
+        [
+            {"id": 3, "parent_id": 1},
+            {"id": 1, "parent_id": None},
+            {"id": 2, "parent_id": 1},
+        ],
+        storage,
+    )
+
+    assert storage.get(Item.id, 1) is item1
+    assert item2.parent is item1
+    assert item3.parent is item1
+    assert item1.parent is None
+    assert item1.children == [item3, item2]
+
+    with pytest.raises(ValueError):
+        storage.load_many(
+            Item, [{"id": 4, "parent_id": None}, {"id": 1, "parent_id": None}]
+        )
+
+    assert storage.get(Item.id, 4) is None
+
+
+def test_load_many_conflict():
+    class Address(Entity):
+        street: str
+
+    class User(Entity):
+        id: int = Field(pk=True)
+        addresses: t.List[Address] = Nested(
+            entity_type=Address,
+            many=True,
+            back_relation=True,
+        )
+
+    storage = Storage()
+    john = User({"id": 1, "addresses": [{"street": "first"}]}, storage)
+
+    for items in (
+        [{"id": 2, "addresses": [{"street": "second"}]}, {"id": 1, "addresses": []}],
+        [{"id": 3, "addresses": []}, {"id": 3, "addresses": [{"street": "third"}]}],
+    ):
+        with pytest.raises(ValueError):
+            User.load_many(items, storage)
+
+    # nothing from rejected batches is in storage
+    assert list(storage.get_entities(User)) == [john]
+    assert list(storage.get_entities(Address)) == john.addresses
+    assert list(storage._relations) == john.addresses
+    assert storage.count_keys(User.id) == 1
+
+
+def test_weak_storage():
+    class User(Entity):
+        class Config:
+            slots = True
+
+        id: int = Field(pk=True)
+        score: int = Field(index=IndexType.SORTED)
+        email: str = Field(index=True)
+
+    class Address(Entity):
+        id: int
+
+    storage = Storage(weak=True)
+    users = User.load_many(
+        [{"id": i, "score": i, "email": f"user{i}@mail.com"} for i in range(100)],
+        storage,
+    )
+    address = Address({"id": 1}, storage)
+
+    for user in users:
+        storage.make_relation(user, address, RelationType.RELATED)
+
+    assert storage.get(User.id, 10) is users[10]
+    assert storage.select(User).filter(score__ge=98).all() == users[98:]
+
+    john = users[0]
+    del user, users
+    gc.collect()
+
+    assert storage.get(User.id, 10) is None
+    assert storage.get(User.id, 0) is john
+    assert storage.select(User).all() == [john]
+    assert storage.select(User).filter(score__ge=0).all() == [john]
+    assert storage.select(User).filter(email="user1@mail.com").all() == []
+    assert storage.get_related_entities(john, Address, RelationType.RELATED) == [
+        address,
+    ]
+
+
+def test_weak_storage_memory():
+    class User(Entity):
+        id: int = Field(pk=True)
+        score: int = Field(index=IndexType.SORTED)
+        email: str = Field(index=True)
+
+    class Holder(Entity):
+        user: User = KeyNested(
+            related_entity_field=User.id,
+            origin="user_id",
+            back_relation=True,
+            reverse_index=True,
+        )
+
+    storage = Storage(weak=True)
+    users = User.load_many(
+        [{"id": i, "score": i, "email": f"user{i}@mail.com"} for i in range(1000)],
+        storage,
+    )
+    holders = Holder.load_many([{"user_id": -i - 1} for i in range(1000)], storage)
+    storage.select(User).filter(score__ge=0).all()
+
+    assert len(storage._pending[User.id]) == 1000
+
+    del users, holders
+    gc.collect()
+    # dead entities of sorted index are dropped by next change
+    user = User({"id": 1, "score": 1, "email": "user1@mail.com"}, storage)
+
+    scores = storage.get_index(User.score)
+
+    assert not storage._get_types()[Holder]
+    assert len(storage.get_index(User.email)._entries) == 1
+    assert len(scores._keys) + len(scores._pending) == 1
+    assert storage._pending == {}
+    assert storage._references[Holder.user] == {}
+    assert storage.select(User).filter(score__ge=0).all() == [user]
+
+
+def test_weak_storage_iterated_bucket():
+    class User(Entity):
+        id: int = Field(pk=True)
+        email: str = Field(index=True)
+
+    storage = Storage(weak=True)
+    users = User.load_many(
+        [{"id": i, "email": "user@mail.com"} for i in range(3)], storage
+    )
+    index = storage.get_index(User.email)
+
+    # entities die while bucket of index is iterated
+    entities = iter(index.get("user@mail.com"))
+    next(entities)
+    users.clear()
+    next(entities, None)
+    gc.collect()
+
+    assert index._entries == {}
+
+
+def test_dump_load(tmp_path):
+    class Address(Entity):
+        street: str
+        user: "User" = Relationship(entity_type="User")  # noqa: F821
+
+    class Group(Entity):
+        name: str
+
+    class User(Entity):
+        id: int = Field(pk=True)
+        score: int = Field(index=IndexType.SORTED)
+        manager: "User" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="manager_id",
+            back_relation=True,
+            required=False,
+        )
+        addresses: t.List[Address] = Nested(
+            entity_type=Address,
+            back_relation=True,
+            many=True,
+        )
+        group: Group = Nested(entity_type=Group, lazy=True)
+
+    storage = Storage()
+    User.load_many(
+        [
+            {
+                "id": 1,
+                "score": 10,
+                "manager_id": 3,
+                "addresses": [{"street": "kirova 1"}, {"street": "kirova 2"}],
+                "group": {"name": "admins"},
+            },
+            {
+                "id": 2,
+                "score": 5,
+                "manager_id": 1,
+                "addresses": [],
+                "group": {"name": "users"},
+            },
+        ],
+        storage,
+    )
+    storage.get(User.id, 2).group
+
+    path = tmp_path / "storage.corm"
+    storage.dump(path)
+
+    for loaded in (Storage.load(path), Storage.loads(storage.dumps())):
+        john, jane = loaded.select(User).order_by("id")
+
+        assert jane.manager is john
+        assert john.manager is None
+        assert loaded.unresolved() == [(User.id, 3)]
+        assert [address.street for address in john.addresses] == [
+            "kirova 1",
+            "kirova 2",
+        ]
+        assert john.addresses[0].user is john
+        assert loaded.select(User).filter(score__gt=7).all() == [john]
+        assert jane.group.name == "users"
+        assert john.group.name == "admins"
+        assert john.dict(snapshot=True) == storage.get(User.id, 1).dict(snapshot=True)
+
+        john.addresses = []
+
+        assert storage.get(User.id, 1).addresses[0].user is not None
+
+        boss = User(
+            {"id": 3, "score": 1, "manager_id": None, "addresses": [], "group": {}},
+            loaded,
+        )
+
+        assert john.manager is boss
+
+
+def test_merge():
+    class User(Entity):
+        id: int = Field(pk=True)
+        manager: "User" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="manager_id",
+            back_relation=True,
+            required=False,
+        )
+        team: t.List["User"] = Relationship(  # noqa: F821
+            entity_type="User",
+            many=True,
+        )
+
+    storage1 = Storage()
+    storage2 = Storage()
+    john = User({"id": 1, "manager_id": 3}, storage1)
+    jane = User({"id": 2, "manager_id": 1}, storage1)
+    bob = User({"id": 3, "manager_id": None}, storage2)
+    alice = User({"id": 4, "manager_id": 2}, storage2)
+    kate = User({"id": 5, "manager_id": 6}, storage2)
+
+    assert john.manager is None
+
+    storage1.merge(storage2)
+
+    assert storage2.get(User.id, 3) is None
+    assert storage1.get(User.id, 3) is bob
+    assert bob.storage is storage1
+    assert john.manager is bob
+    assert alice.manager is jane
+    assert bob.team == [john]
+    assert jane.team == [alice]
+    assert storage1.unresolved() == [(User.id, 6)]
+    assert storage1.select(User).order_by("id").all() == [
+        john,
+        jane,
+        bob,
+        alice,
+        kate,
+    ]
+
+    storage3 = Storage()
+    User({"id": 1, "manager_id": None}, storage3)
+    User({"id": 6, "manager_id": None}, storage3)
+
+    with pytest.raises(ValueError):
+        storage1.merge(storage3)
+
+    assert storage1.get(User.id, 6) is None
+
+    storage2.merge(kate)
+
+    assert storage1.get(User.id, 5) is None
+    assert storage2.get(User.id, 5) is kate
+    assert storage2.get_related_entities(kate, User, RelationType.RELATED) == []
+
+
+class Item(Entity):
+    id: int = Field(pk=True)
+    parent: "Item" = KeyNested(
+        related_entity_field=id,
+        origin="parent_id",
+        back_relation=True,
+        required=False,
+    )
+    children: t.List["Item"] = Relationship(entity_type="Item", many=True)
+
+
+def test_parallel_load():
+    # workers find entity class by importing this module, registry of this
+    # process is cleared before every test
+    registry.add(Item)
+
+    storage = Storage()
+    items = storage.parallel_load(
+        Item,
+        ({"id": i, "parent_id": (i - 1) // 2 or None} for i in range(1, 101)),
+        workers=2,
+        chunk_size=10,
+    )
+
+    assert [item.id for item in items] == list(range(1, 101))
+    assert storage.get(Item.id, 50) is items[49]
+    assert items[99].parent is items[48]
+    assert items[0].children == [items[2], items[3]]
+    assert storage.unresolved() == []
+
+
+def test_aload_stream():
+    class Item(Entity):
+        id: int = Field(pk=True)
+        parent: "Item" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="parent_id",
+            back_relation=True,
+            required=False,
+        )
+
+    async def stream():
+        yield b'{"id": 1, "parent_id": null}\n'
+        yield '{"id": 2, "parent_id": 1}'
+        yield b"\n"
+        yield {"id": 3, "parent_id": 4}
+        yield {"id": 5, "parent_id": 6}
+        yield {"id": 4, "parent_id": 1}
+
+    storage = Storage()
+    progress = []
+    result = asyncio.run(
+        storage.aload_stream(Item, stream(), batch_size=2, progress=progress.append),
+    )
+
+    assert result.count == 5
+    assert result.unresolved == [(Item.id, 6)]
+    assert progress == [2, 4, 5]
+    assert storage.get(Item.id, 3).parent is storage.get(Item.id, 4)
+
+
+def test_stats():
+    class User(Entity):
+        id: int = Field(pk=True)
+        manager: "User" = KeyNested(
+            related_entity_field=id,
+            origin="manager_id",
+            back_relation=RelationType.CHILD,
+            required=False,
+        )
+
+    class Address(Entity):
+        street: str
+
+    class Company(Entity):
+        addresses: t.List[Address] = Nested(
+            entity_type=Address,
+            many=True,
+            back_relation=RelationType.PARENT,
+        )
+
+    assert Storage().stats is None
+
+    storage = Storage(stats=True)
+
+    User.load_many([{"id": 1, "manager_id": None}, {"id": 2, "manager_id": 1}], storage)
+    User(data={"id": 3, "manager_id": 10}, storage=storage)
+    company = Company(
+        data={"addresses": [{"street": "first"}, {"street": "second"}]},
+        storage=storage,
+    )
+
+    assert storage.get(User.id, 2).manager.id == 1
+    assert storage.get(User.id, 5) is None
+
+    company.dict(snapshot=True)
+
+    stats = storage.stats.as_dict()
+    user_type = f"{User.__module__}.{User.__name__}"
+    company_type = f"{Company.__module__}.{Company.__name__}"
+
+    assert stats["entities"] == {
+        user_type: 3,
+        company_type: 1,
+        f"{Address.__module__}.{Address.__name__}": 2,
+    }
+    assert stats["keys"] == {f"{user_type}.id": 3}
+    assert stats["relations"] == {user_type: {"CHILD": 1}, company_type: {"PARENT": 2}}
+    assert stats["pending"] == 1
+    # keys of relations are looked up while entities are loaded as well
+    assert stats["get"] == {"hits": 2, "misses": 3, "hit_rate": 0.4}
+    assert all(stats["time"][kind] > 0 for kind in ("load", "dump", "relations"))
+
+    storage.stats.reset()
+
+    assert storage.stats.as_dict()["get"] == {"hits": 0, "misses": 0, "hit_rate": 0.0}
+
+
+def test_loads_into_storage():
+    class User(Entity):
+        id: int = Field(pk=True)
+        age: int = Field(index=IndexType.SORTED)
+
+    first = Storage()
+    second = Storage()
+    User(data={"id": 1, "age": 20}, storage=first)
+    User(data={"id": 2, "age": 30}, storage=second)
+
+    storage = Storage()
+    snapshot.loads(storage, first.dumps())
+    snapshot.loads(storage, second.dumps())
+
+    # entities restored before are not indexed again
+    assert [user.id for user in storage.select(User).filter(age__ge=0)] == [1, 2]
+
+
+def test_remove():
+    class User(Entity):
+        id: int = Field(pk=True)
+        email: str = Field(index=True)
+        tenant_id: int = 1
+        key: t.Tuple[int, int] = CompositeKey("tenant_id", "id")
+
+    class Event(Entity):
+        class Config:
+            track = False
+
+        name: str = Field(index=True)
+
+    storage = Storage()
+    user = User({"id": 1, "email": "a"}, storage)
+    event = Event({"name": "a"}, storage)
+    storage.remove(user)
+    storage.remove(event)
+
+    # removed entities don't come back when they are changed
+    user.id = 2
+    user.email = "b"
+    user.tenant_id = 2
+    event.name = "b"
+
+    assert storage.get(User.id, 2) is None
+    assert storage.get(User.key, (2, 2)) is None
+    assert storage.select(User).filter(email="b").all() == []
+    assert storage.select(User).all() == []
+    assert storage.get_index(Event.name).get("b") == ()
+    assert User({"id": 2, "email": "b"}, storage).key == (1, 2)
+
+
+def test_composite_key():
+    class User(Entity):
+        tenant_id: int
+        id: int
+        name: str
+        key: t.Tuple[int, int] = CompositeKey("tenant_id", "id")
+
+    storage = Storage()
+    john, jane = User.load_many(
+        [
+            {"tenant_id": 1, "id": 1, "name": "John"},
+            {"tenant_id": 2, "id": 1, "name": "Jane"},
+        ],
+        storage,
+    )
+
+    assert john.key == (1, 1)
+    assert storage.get(User.key, (1, 1)) is john
+    assert storage.get(User.key, (2, 1)) is jane
+    assert storage.select(User).filter(key=(2, 1)).one() is jane
+    assert john.dict() == {"tenant_id": 1, "id": 1, "name": "John"}
+
+    with pytest.raises(ValueError):
+        User({"tenant_id": 1, "id": 1, "name": "Bob"}, storage)
+
+    with pytest.raises(ValueError):
+        jane.tenant_id = 1
+
+    assert jane.tenant_id == 2
+
+    john.tenant_id = 3
+
+    assert storage.get(User.key, (1, 1)) is None
+    assert storage.get(User.key, (3, 1)) is john
+
+    with pytest.raises(ValueError):
+        john.key = (4, 1)
+
+    with pytest.raises(ValueError):
+
+        class Broken(Entity):
+            id: int
+            key: t.Tuple[int, int] = CompositeKey("id", "name")
+
+
+def test_untracked_entities():
+    class Event(Entity):
+        class Config:
+            track = False
+
+        name: str
+
+    class Order(Entity):
+        class Config:
+            track = False
+
+        id: int = Field(pk=True)
+
+    class Tag(Entity):
+        class Config:
+            track = False
+
+        name: str = Field(index=True)
+
+    storage = Storage()
+    refs = [weakref.ref(Event({"name": "event"}, storage)) for _ in range(10)]
+    order = Order({"id": 1}, storage)
+    tag = Tag({"name": "new"}, storage)
+    gc.collect()
+
+    # storage doesn't keep entities without primary key alive
+    assert all(ref() is None for ref in refs)
+    assert storage.get(Order.id, 1) is order
+    types = storage._get_types()
+    assert Event not in types and Order not in types
+
+    with pytest.raises(ValueError):
+        storage.select(Event)
+
+    other = Storage()
+    other.merge(storage)
+
+    assert order.storage is other and tag.storage is other
+    assert other.get(Order.id, 1) is order
+    assert storage.get(Order.id, 1) is None
+    assert list(other.get_index(Tag.name).get("new")) == [tag]
@@ -0,0 +1,48 @@
+import typing as t
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from corm import ConcurrentStorage, Entity, Field, IndexType, KeyNested, Relationship
+
+
+def test_concurrent_load(switch_often):
+    class Item(Entity):
+        id: int = Field(pk=True)
+        score: int = Field(index=IndexType.SORTED)
+        parent: "Item" = KeyNested(  # noqa: F821
+            related_entity_field=id,
+            origin="parent_id",
+            back_relation=True,
+            required=False,
+        )
+        children: t.List["Item"] = Relationship(  # noqa: F821
+            entity_type="Item",
+            many=True,
+        )
+
+    storage = ConcurrentStorage(stripes=4)
+    count = 2000
+
+    def load(chunk):
+        # parents of items are loaded by other threads, before or after
+        for i in chunk:
+            Item({"id": i, "score": i % 10, "parent_id": i // 10 or None}, storage)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(load, [range(i, count, 8) for i in range(8)]))
+
+    assert storage.unresolved() == []
+    assert len(storage.select(Item).all()) == count
+    assert len(storage.select(Item).filter(score=3).all()) == count // 10
+
+    for i in range(1, count // 10):
+        children = storage.get(Item.id, i).children
+
+        assert sorted(child.id for child in children) == list(
+            range(i * 10, i * 10 + 10)
+        )
+
+    with pytest.raises(ValueError):
+        Item({"id": 1, "score": 0, "parent_id": None}, storage)